@@ -0,0 +1,415 @@
+"""Benchmarks the BovHEAT pipeline on synthetic SCR data.
+
+Generates SCR workbooks or in-memory frames in the weekly or 50-day schema of example/data
+and times every stage of the pipeline. Results are written as JSON for comparison across versions.
+
+    python -m bovheat_src.bh_benchmark --schema weekly --farms 2 --cows 100 --days 120 -o new.json
+    python -m bovheat_src.bh_benchmark --schema weekly --farms 2 --cows 100 --days 120 --compare new.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from bovheat_src import bh_input, bh_output, bovheat
+
+BENCHMARK_VERSION = 1
+
+SCHEMAS = ("weekly", "50days")
+
+STAGES = ("read", "clean", "calving", "window", "heats", "xlsx", "pdf")
+
+SOURCE_COLUMNS = ["Cow Number", "Date", "Time", "Activity Change", "Lactation Number", "Days in Lactation"]
+
+# column order of the SCR exports in example/data, without the leading row number column
+WEEKLY_COLUMNS = [
+    "Cow Number",
+    "Date",
+    "Time",
+    "Raw Activity Data",
+    "Activity Change",
+    "Lactation Number",
+    "Days in Lactation",
+    "Lactation Status",
+    "Effective Breeding Date",
+    "Activity 24 Hours From Last Identification",
+    "Daily Activity",
+]
+
+FIFTY_DAYS_COLUMNS = ["Cow Number", "Date", "Time", "Lactation Number", "Days in Lactation", "Activity Change"]
+
+OBSERVATIONS_PER_DAY = 12  # one observation every 2 hours
+
+
+# %%
+def make_farm_data(rng, cows, lactations, days, start_date):
+    """Creates the continuous 2 hour activity data of all cows of one farm.
+
+    Every cow calves lactations times within the days, heats recur every 21 days from about
+    25 days after calving. Some 10:00pm observations and random observations are missing.
+
+    Returns:
+        pd.DataFrame -- one row per cow and observation, sorted by cow and datetime
+    """
+    observation_count = days * OBSERVATIONS_PER_DAY
+    datetimes = pd.Timestamp(start_date) + pd.to_timedelta(np.arange(observation_count) * 2, unit="h")
+    day_of_observation = np.arange(observation_count) // OBSERVATIONS_PER_DAY
+
+    cow_dfs = []
+    for cow_number in np.sort(rng.choice(np.arange(100, 10000), size=cows, replace=False)):
+        first_lactation = rng.integers(0, 5)
+        first_dim = rng.integers(100, 400)
+
+        # lactation number and days in lactation per day, calving resets days in lactation
+        lactation_numbers = np.full(days, first_lactation, dtype=float)
+        dims = np.where(first_lactation > 0, first_dim + np.arange(days), np.nan)
+        calving_days = [int((number + rng.uniform(0.2, 0.8)) * days / lactations) for number in range(lactations)]
+        for calving_day in calving_days:
+            lactation_numbers[calving_day:] += 1
+            dims[calving_day:] = np.arange(days - calving_day)
+
+        activity = np.round(rng.normal(0, 6, observation_count))
+        for calving_day in calving_days:
+            heat_day = calving_day + rng.integers(20, 35)
+            while heat_day < days:
+                heat_start = heat_day * OBSERVATIONS_PER_DAY + rng.integers(0, OBSERVATIONS_PER_DAY)
+                heat_slice = slice(heat_start, min(heat_start + rng.integers(3, 7), observation_count))
+                activity[heat_slice] += rng.integers(35, 80, heat_slice.stop - heat_slice.start)
+                heat_day += 21 + rng.integers(-2, 3)
+
+        missing = rng.random(observation_count) < 0.01
+        missing |= (np.arange(observation_count) % OBSERVATIONS_PER_DAY == 11) & (
+            rng.random(observation_count) < 0.3
+        )
+        activity[missing] = np.nan
+
+        lactation_number = lactation_numbers[day_of_observation]
+        dim = dims[day_of_observation]
+        cow_dfs.append(
+            pd.DataFrame(
+                {
+                    "Cow Number": cow_number,
+                    "datetime": datetimes,
+                    "Raw Activity Data": np.round(rng.uniform(15, 60, observation_count)),
+                    "Activity Change": activity,
+                    "Lactation Number": lactation_number,
+                    "Days in Lactation": dim,
+                    "Lactation Status": np.where(
+                        lactation_number == 0, "Heifer", np.where(dim > 305, "Dry", "Lactating")
+                    ),
+                    "Effective Breeding Date": pd.Timestamp(start_date) - pd.Timedelta(days=int(first_dim)),
+                    "Activity 24 Hours From Last Identification": np.round(rng.uniform(350, 700, observation_count)),
+                    "Daily Activity": np.round(rng.uniform(350, 700, days))[day_of_observation],
+                }
+            )
+        )
+
+    return pd.concat(cow_dfs, ignore_index=True)
+
+
+def make_farm_files(schema, farm_df, days, start_date):
+    """Splits farm data into SCR export files.
+
+    weekly: one file per week, including the empty 12:00am row of the following day.
+    50days: one file every 14 days with up to 50 days of history, followed by an empty
+    00:00 row per cow.
+
+    Returns:
+        list -- (file name, dataframe in SCR layout) tuples
+    """
+    start_date = pd.Timestamp(start_date)
+    files = []
+
+    if schema == "weekly":
+        for file_start in pd.date_range(start_date, periods=max(days // 7, 1), freq="7D"):
+            file_stop = file_start + pd.Timedelta(days=7)
+            file_df = farm_df[(farm_df["datetime"] >= file_start) & (farm_df["datetime"] <= file_stop)].copy()
+            last_rows = file_df["datetime"] == file_stop
+            file_df.loc[
+                last_rows, ["Raw Activity Data", "Activity Change", "Days in Lactation", "Daily Activity"]
+            ] = np.nan
+            file_df["Lactation Number"] = file_df["Lactation Number"].astype(int)
+            file_df["Time"] = file_df["datetime"].dt.strftime("%I:%M %p").str.lstrip("0")
+            file_name = f"{file_stop:%B} {file_stop.day} {file_stop:%Y}.xlsx"
+            files.append((file_name, get_scr_layout(file_df, WEEKLY_COLUMNS)))
+
+    elif schema == "50days":
+        for file_stop in pd.date_range(start_date + pd.Timedelta(days=14), periods=max(days // 14, 1), freq="14D"):
+            file_start = max(file_stop - pd.Timedelta(days=50), start_date)
+            file_df = farm_df[(farm_df["datetime"] >= file_start) & (farm_df["datetime"] < file_stop)]
+            empty_df = pd.DataFrame({"Cow Number": file_df["Cow Number"].unique(), "datetime": file_stop})
+            file_df = pd.concat([file_df, empty_df], ignore_index=True).sort_values(
+                ["Cow Number", "datetime"], kind="stable"
+            )
+            file_df["Time"] = file_df["datetime"].dt.strftime("%H:%M")
+            file_name = f"Cows_{file_start.day}.{file_start.month}. - {file_stop.day}.{file_stop.month}.xlsx"
+            files.append((file_name, get_scr_layout(file_df, FIFTY_DAYS_COLUMNS)))
+
+    else:
+        raise ValueError(f"unknown schema {schema}, choose one of {', '.join(SCHEMAS)}")
+
+    return files
+
+
+def get_scr_layout(file_df, columns):
+    """Orders columns like an SCR export, rows are numbered from 1 in the unnamed first column"""
+    file_df = file_df.assign(Date=file_df["datetime"].dt.normalize())[columns]
+    file_df.index = pd.RangeIndex(1, len(file_df) + 1)
+    return file_df
+
+
+def make_source_files(config):
+    """Creates the SCR files of all farms.
+
+    Returns:
+        dict -- {farm folder name: list of (file name, dataframe in SCR layout)}
+    """
+    rng = np.random.default_rng(config["seed"])
+    return {
+        f"farm_{farm_no + 1:02d}": make_farm_files(
+            config["schema"],
+            make_farm_data(rng, config["cows"], config["lactations"], config["days"], config["start_date"]),
+            config["days"],
+            config["start_date"],
+        )
+        for farm_no in range(config["farms"])
+    }
+
+
+def write_workbooks(source_files, data_dir):
+    """Writes SCR files as xlsx workbooks into one subfolder per farm"""
+    for foldername, files in source_files.items():
+        os.makedirs(os.path.join(data_dir, foldername), exist_ok=True)
+        for file_name, file_df in files:
+            file_df.to_excel(os.path.join(data_dir, foldername, file_name), engine="xlsxwriter")
+
+
+def get_source_frame(source_files):
+    """Returns source data like bh_input.get_source_data, without writing and reading workbooks"""
+    translation_table = {column: column for column in SOURCE_COLUMNS}
+
+    source_dfs = []
+    for foldername, files in source_files.items():
+        for _, file_df in files:
+            data = file_df[[column for column in file_df.columns if column in SOURCE_COLUMNS]]
+            source_dfs.append(
+                bh_input.clean_source_table(data.reset_index(drop=True), foldername, translation_table)
+            )
+
+    source_df = pd.concat(source_dfs, axis=0, sort=False)
+    source_df["foldername"] = source_df["foldername"].astype("category")
+    return source_df
+
+
+# %%
+def run_stages(config, source_files, work_dir):
+    """Runs every pipeline stage once.
+
+    Returns:
+        (dict, dict) -- seconds per stage, row counts
+    """
+    stage_seconds = {}
+
+    @contextlib.contextmanager
+    def timed(stage):
+        start = time.perf_counter()
+        yield
+        stage_seconds[stage] = time.perf_counter() - start
+
+    with timed("read"):
+        if config["source"] == "workbooks":
+            source_df = bh_input.get_source_data(
+                "eng",
+                core_count=config["cores"],
+                relative_path=os.path.join(work_dir, "data"),
+                reader=config["reader"],
+            )
+        else:
+            source_df = get_source_frame(source_files)
+
+    with timed("clean"):
+        cleaned_df = bovheat.get_cleaned_data(source_df)
+
+    with timed("calving"):
+        calved_df = bovheat.add_calving_dates(cleaned_df)
+
+    with timed("window"):
+        sections_df = bovheat.cut_time_window(
+            calved_df, config["start_dim"], config["stop_dim"], config["interpolation_limit"]
+        )
+
+    with timed("heats"):
+        heats_df = bovheat.calc_all_heats(sections_df, config["threshold"], config["minheatlength"])
+        heats_df = heats_df[heats_df["act_usable"] > 0]
+
+    filename = os.path.join(work_dir, "BovHEAT_benchmark")
+    with timed("xlsx"):
+        bh_output.write_xlsx(heats_df, filename=filename)
+
+    if not config["skip_pdf"]:
+        with timed("pdf"):
+            bh_output.write_pdf(
+                heats_df, sections_df, config["threshold"], filename, "dim", core_count=config["cores"]
+            )
+
+    row_counts = {
+        "source": len(source_df),
+        "cleaned": len(cleaned_df),
+        "lactations": int(heats_df.groupby(bovheat.HEAT_GROUP_KEYS, observed=True).ngroups),
+        "sections": len(sections_df),
+        "heats": len(heats_df),
+    }
+    return stage_seconds, row_counts
+
+
+def run_benchmark(config):
+    """Generates synthetic data for config and times every stage, see get_args for config keys.
+
+    Returns:
+        dict -- JSON serializable benchmark result, stages holds the fastest time of all repeats
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        start = time.perf_counter()
+        source_files = make_source_files(config)
+        if config["source"] == "workbooks":
+            write_workbooks(source_files, os.path.join(work_dir, "data"))
+        generate_seconds = time.perf_counter() - start
+
+        runs = []
+        # stage functions print status messages and bh_progress bars, timings stay free of console output
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for _ in range(config["repeat"]):
+                stage_seconds, row_counts = run_stages(config, source_files, work_dir)
+                runs.append(stage_seconds)
+
+    return {
+        "benchmark_version": BENCHMARK_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": get_commit(),
+        "platform": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "system": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": config,
+        "files": sum(len(files) for files in source_files.values()),
+        "rows": row_counts,
+        "generate_seconds": generate_seconds,
+        "runs": runs,
+        "stages": {stage: min(run[stage] for run in runs) for stage in STAGES if stage in runs[0]},
+    }
+
+
+def get_commit():
+    """Returns the git commit of the benchmarked code, None outside of a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_results(result, baseline=None):
+    """Formats stage times as table, with the ratio to a baseline result if given"""
+    lines = [f"{'stage':<10}{'seconds':>10}" + (f"{'baseline':>10}{'ratio':>8}" if baseline else "")]
+    for stage, seconds in result["stages"].items():
+        line = f"{stage:<10}{seconds:>10.3f}"
+        if baseline and stage in baseline["stages"]:
+            baseline_seconds = baseline["stages"][stage]
+            line += f"{baseline_seconds:>10.3f}{seconds / baseline_seconds:>8.2f}"
+        lines.append(line)
+    lines.append(f"{'total':<10}{sum(result['stages'].values()):>10.3f}")
+    return "\n".join(lines)
+
+
+# %%
+def get_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the BovHEAT pipeline on synthetic SCR data")
+
+    parser.add_argument("--schema", type=str, choices=SCHEMAS, default="weekly", help="default=weekly")
+    parser.add_argument("--farms", type=int, default=1, help="number of farm folders, default=1")
+    parser.add_argument("--cows", type=int, default=50, help="number of cows per farm, default=50")
+    parser.add_argument(
+        "--lactations", type=int, default=1, help="number of calvings per cow within days, default=1"
+    )
+    parser.add_argument("--days", type=int, default=84, help="number of days of data, default=84")
+    parser.add_argument(
+        "--source",
+        type=str,
+        choices=["workbooks", "frames"],
+        default="workbooks",
+        help="workbooks: write and read xlsx files, frames: build source data in memory, default=workbooks",
+    )
+    parser.add_argument("-c", "--cores", type=int, default=1, help="cores for reading and PDF, default=1")
+    parser.add_argument("--reader", type=str, choices=["default", "fast"], default="default")
+    parser.add_argument("--skip_pdf", action="store_true", help="do not time writing the PDF")
+    parser.add_argument("--repeat", type=int, default=1, help="repeat all stages, fastest time is kept")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data, default=0")
+    parser.add_argument("-o", "--output", type=str, help="write results to this JSON file")
+    parser.add_argument("--compare", type=str, metavar="FILE", help="print ratios to an earlier JSON result")
+
+    args = parser.parse_args(argv)
+
+    if min(args.farms, args.cows, args.lactations, args.days, args.repeat) < 1:
+        parser.error("farms, cows, lactations, days and repeat have to be at least 1.")
+
+    return args
+
+
+def get_config(args):
+    return {
+        "schema": args.schema,
+        "farms": args.farms,
+        "cows": args.cows,
+        "lactations": args.lactations,
+        "days": args.days,
+        "start_date": "2019-01-07",
+        "source": args.source,
+        "cores": args.cores,
+        "reader": args.reader,
+        "skip_pdf": args.skip_pdf,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "start_dim": -5,
+        "stop_dim": 30,
+        "threshold": 35,
+        "minheatlength": 1,
+        "interpolation_limit": 2,
+    }
+
+
+def main(argv=None):
+    args = get_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+
+    result = run_benchmark(get_config(args))
+    print(format_results(result, baseline))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(result, output_file, indent=2)
+        print(f"# Benchmark results: {args.output} created.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import posixpath
+import zipfile
+from xml.etree.ElementTree import fromstring, iterparse
+
+import numpy as np
+import pandas as pd
+from openpyxl.cell.text import Text
+from openpyxl.reader.strings import read_string_table
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+from pandas.io.parsers import TextParser
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+DIMENSION_TAG = MAIN_NS + "dimension"
+ROW_TAG = MAIN_NS + "row"
+CELL_TAG = MAIN_NS + "c"
+VALUE_TAG = MAIN_NS + "v"
+INLINE_STRING_TAG = MAIN_NS + "is"
+
+DIGITS = "0123456789"
+
+
+def read_excel_fast(path, columns):
+    """Reads the given columns of the first sheet, like pd.read_excel(path, usecols=columns).
+
+    .xlsx files are streamed row by row and only cells of the requested columns are converted.
+    .xls files are read with the calamine engine, if python-calamine is installed.
+
+    Returns:
+        pd.DataFrame -- requested columns in sheet order, None if the file can not be read this way,
+        e.g. unexpected layout, missing columns or .xls without calamine
+    """
+    try:
+        if path.endswith(".xlsx"):
+            return read_xlsx_columns(path, columns)
+        return read_calamine_columns(path, columns)
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+def read_calamine_columns(path, columns):
+    try:
+        import python_calamine  # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError:
+        return None
+
+    return pd.read_excel(path, usecols=columns, sheet_name=0, engine="calamine")
+
+
+def read_xlsx_columns(path, columns):
+    with zipfile.ZipFile(path) as archive:
+        sheet_path, epoch = get_first_sheet(archive)
+        shared_strings = get_shared_strings(archive)
+        date_styles, timedelta_styles = get_date_styles(archive)
+
+        with archive.open(sheet_path) as sheet_file:
+            rows = iter_sheet_rows(sheet_file)
+
+            header_number, header_element = next(rows, (None, None))
+            if header_number != 1:
+                return None
+            header_cells = get_row_cells(header_element)
+
+            # first occurrence wins, like usecols with duplicated headers
+            column_letters = {}
+            for letters in sorted(header_cells, key=lambda letters: (len(letters), letters)):
+                value = convert_cell(header_cells[letters], shared_strings, date_styles, timedelta_styles, epoch)
+                if isinstance(value, str):
+                    column_letters.setdefault(value, letters)
+            if not all(column in column_letters for column in columns):
+                return None
+
+            # keep sheet order of the columns, like read_excel
+            letters_order = sorted(
+                (column_letters[column] for column in columns), key=lambda letters: (len(letters), letters)
+            )
+            header = [
+                column for letters in letters_order for column in columns if column_letters[column] == letters
+            ]
+            projected_letters = set(letters_order)
+            empty_row = [""] * len(letters_order)
+
+            data = [header]
+            last_row_with_data = 0
+            for row_number, row_element in rows:
+                cells = get_row_cells(row_element, projected_letters)
+
+                # rows missing in the sheet are empty rows
+                while len(data) < row_number - 1:
+                    data.append(empty_row)
+
+                row = [
+                    convert_cell(cells[letters], shared_strings, date_styles, timedelta_styles, epoch)
+                    if letters in cells
+                    else ""
+                    for letters in letters_order
+                ]
+                data.append(row)
+                if any(value != "" for value in row):
+                    last_row_with_data = len(data) - 1
+
+    # trailing empty rows are dismissed, like read_excel
+    data = data[: last_row_with_data + 1]
+
+    return TextParser(data, header=0, skip_blank_lines=False).read()
+
+
+def get_first_sheet(archive):
+    """Returns archive path of the first sheet and the date epoch of the workbook"""
+    workbook = fromstring(archive.read("xl/workbook.xml"))
+
+    epoch = CALENDAR_WINDOWS_1900
+    workbook_properties = workbook.find(MAIN_NS + "workbookPr")
+    if workbook_properties is not None and workbook_properties.get("date1904") in ("1", "true"):
+        epoch = CALENDAR_MAC_1904
+
+    relation_id = workbook.find(f"{MAIN_NS}sheets/{MAIN_NS}sheet").get(REL_NS + "id")
+    relations = fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    for relation in relations.iter(PACKAGE_REL_NS + "Relationship"):
+        if relation.get("Id") == relation_id:
+            target = relation.get("Target")
+            if target.startswith("/"):
+                return target.lstrip("/"), epoch
+            return posixpath.normpath(posixpath.join("xl", target)), epoch
+
+    raise KeyError(f"sheet relation {relation_id} not found")
+
+
+def get_shared_strings(archive):
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    with archive.open("xl/sharedStrings.xml") as strings_file:
+        return read_string_table(strings_file)
+
+
+def get_date_styles(archive):
+    """Returns style ids formatted as date and as timedelta"""
+    if "xl/styles.xml" not in archive.namelist():
+        return set(), set()
+    stylesheet = Stylesheet.from_tree(fromstring(archive.read("xl/styles.xml")))
+    return stylesheet.date_formats, stylesheet.timedelta_formats
+
+
+def iter_sheet_rows(sheet_file):
+    """Yields (row number, row element) for each sheet row, elements are cleared after use"""
+    for _event, element in iterparse(sheet_file):
+        if element.tag == DIMENSION_TAG:
+            # read_excel starts at the top left cell of the dimension, only A1 is supported
+            top_left = element.get("ref", "A1").split(":")[0]
+            if top_left != "A1":
+                raise ValueError(f"sheet dimension starts at {top_left}")
+            continue
+        if element.tag != ROW_TAG:
+            continue
+
+        yield int(element.attrib["r"]), element
+        element.clear()
+
+
+def get_row_cells(row_element, column_letters=None):
+    """Returns {column letters: (raw value, data type, style id)} of a row, optionally only of column_letters"""
+    cells = {}
+    for cell in row_element.iter(CELL_TAG):
+        # cells without coordinate are unexpected, KeyError falls back to read_excel
+        letters = cell.attrib["r"].rstrip(DIGITS)
+        if column_letters is not None and letters not in column_letters:
+            continue
+
+        data_type = cell.get("t", "n")
+        if data_type == "inlineStr":
+            inline_string = cell.find(INLINE_STRING_TAG)
+            value = None if inline_string is None else Text.from_tree(inline_string).content
+        else:
+            value = cell.findtext(VALUE_TAG) or None
+        cells[letters] = (value, data_type, int(cell.get("s", 0)))
+
+    return cells
+
+
+def convert_cell(cell, shared_strings, date_styles, timedelta_styles, epoch):
+    """Converts a raw cell like openpyxl in read only, data only mode followed by read_excel"""
+    value, data_type, style_id = cell
+
+    if value is None:
+        return ""
+    if data_type == "n":
+        number = float(value) if "." in value or "E" in value or "e" in value else int(value)
+        if style_id in date_styles:
+            try:
+                return from_excel(number, epoch, timedelta=style_id in timedelta_styles)
+            except (OverflowError, ValueError):
+                # openpyxl treats dates out of range as error cells
+                return np.nan
+        if int(number) == number:
+            return int(number)
+        return float(number)
+    if data_type == "s":
+        return shared_strings[int(value)]
+    if data_type == "b":
+        return bool(int(value))
+    if data_type == "d":
+        return from_ISO8601(value)
+    if data_type == "e":
+        return np.nan
+    # str and inlineStr
+    return value
@@ -0,0 +1,215 @@
+import multiprocessing
+import os
+import sys
+from itertools import starmap
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pandas as pd
+
+from bovheat_src import bh_profile
+
+EXECUTOR_KINDS = ("serial", "thread", "process")
+
+# more shards than workers, so a few slow shards do not leave other workers idle
+SHARDS_PER_WORKER = 4
+
+MASKED_ARRAYS = (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)
+
+
+class Executor:
+    """Runs tasks serially, in a thread pool or in a process pool.
+
+    The pool is started on first use and reused by all following parallel stages until close(),
+    so worker processes are started only once per run. With one worker, tasks run serially.
+    """
+
+    def __init__(self, kind="process", worker_count=1):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"unknown executor {kind}, choose one of {', '.join(EXECUTOR_KINDS)}")
+
+        self.kind = "serial" if worker_count <= 1 else kind
+        self.worker_count = 1 if self.kind == "serial" else worker_count
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_pool(self):
+        if self._pool is None:
+            if self.kind == "thread":
+                self._pool = ThreadPool(processes=self.worker_count)
+            else:
+                # workers inherit the resource tracker of this process instead of starting their own,
+                # otherwise shared memory attached in a worker is reported as leaked at its exit
+                if os.name == "posix":
+                    resource_tracker.ensure_running()
+                self._pool = multiprocessing.Pool(processes=self.worker_count)
+        return self._pool
+
+    def starmap(self, func, args_list):
+        """Returns func(*args) for each args in args_list, in order of args_list"""
+        if self.kind == "serial":
+            return list(starmap(func, args_list))
+        return self.get_pool().starmap(func, args_list)
+
+    def imap_unordered(self, func, items):
+        """Yields func(item) for each item as soon as it is finished, in any order"""
+        if self.kind == "serial":
+            return map(func, items)
+        return self.get_pool().imap_unordered(func, items)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+def map_shards(executor, func, df, key_columns, *args, progress=None):
+    """Splits df into shards of whole key groups and returns func(shard_df, *args) of every shard.
+
+    Shards are contiguous ranges of the sorted key groups, e.g. cows, so results of functions
+    that sort by these keys can be concatenated in shard order. Process executors send shards
+    through shared memory, tasks only carry the row range of their shard.
+
+    Finished key groups are counted in progress, a bh_progress.Progress, if given.
+
+    Returns:
+        list -- results in shard order, one result of the whole df for serial executors
+    """
+    group_ids = df.groupby(key_columns, sort=True, observed=True).ngroup().to_numpy()
+    group_count = group_ids.max() + 1 if len(group_ids) else 0
+    shard_count = min(group_count, executor.worker_count * SHARDS_PER_WORKER)
+    if progress is not None:
+        progress.total = int(group_count)
+
+    if executor.kind == "serial" or shard_count < 2:
+        results = [func(df, *args)]
+        if progress is not None:
+            progress.update(int(group_count))
+        return results
+
+    # rows with missing keys join the first shard
+    shard_ids = np.maximum(group_ids, 0) * shard_count // group_count
+    row_order = np.argsort(shard_ids, kind="stable")
+    bounds = np.searchsorted(shard_ids[row_order], np.arange(shard_count + 1))
+
+    if executor.kind == "process":
+        blocks, frame_spec = share_frame(df, row_order)
+    else:
+        blocks, frame_spec = [], {"frame": df.iloc[row_order].reset_index(drop=True)}
+
+    try:
+        tasks = [
+            (shard_no, func, get_shard_spec(frame_spec, bounds[shard_no], bounds[shard_no + 1]), args)
+            for shard_no in range(shard_count)
+        ]
+        shard_group_counts = np.bincount(np.arange(group_count) * shard_count // group_count, minlength=shard_count)
+        results = {}
+        for shard_no, result in bh_profile.imap_recorded(executor, run_shard, tasks):
+            results[shard_no] = result
+            if progress is not None:
+                progress.update(int(shard_group_counts[shard_no]))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return [results[shard_no] for shard_no in range(shard_count)]
+
+
+def run_shard(task):
+    shard_no, func, shard_spec, args = task
+    return shard_no, func(attach_frame(shard_spec), *args)
+
+
+def share_frame(df, row_order):
+    """Copies the rows of df in row_order into shared memory blocks.
+
+    Numeric, datetime, nullable and categorical columns are shared. Other columns, e.g. strings,
+    are kept in the frame spec and pickled with each shard.
+
+    Returns:
+        (list, dict) -- shared memory blocks to be closed and unlinked by the caller, frame spec
+    """
+    blocks = []
+    shared_columns = []
+    pickled_columns = []
+
+    for column in df.columns:
+        values = df[column].array
+        if isinstance(values, pd.Categorical):
+            kind, arrays = "categorical", {"codes": values.codes}
+        elif isinstance(values, MASKED_ARRAYS):
+            data = values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=values.dtype.numpy_dtype.type(0))
+            kind, arrays = "masked", {"data": data, "mask": np.asarray(values.isna())}
+        elif isinstance(df[column].dtype, np.dtype) and df[column].dtype.kind in "biufmM":
+            kind, arrays = "numpy", {"values": np.asarray(values)}
+        else:
+            pickled_columns.append(column)
+            continue
+
+        array_specs = {}
+        for part, array in arrays.items():
+            array = array[row_order]
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            array_specs[part] = (block.name, array.dtype.str, len(array))
+        shared_columns.append((column, kind, df[column].dtype, array_specs))
+
+    frame_spec = {
+        "columns": list(df.columns),
+        "shared": shared_columns,
+        "pickled": df[pickled_columns].iloc[row_order].reset_index(drop=True),
+    }
+    return blocks, frame_spec
+
+
+def get_shard_spec(frame_spec, start, stop):
+    """Returns the spec of rows start to stop, pickled columns are sliced here"""
+    if "frame" in frame_spec:
+        return {"frame": frame_spec["frame"].iloc[start:stop]}
+
+    shard_spec = dict(frame_spec, start=start, stop=stop)
+    shard_spec["pickled"] = frame_spec["pickled"].iloc[start:stop]
+    return shard_spec
+
+
+def attach_frame(shard_spec):
+    """Builds the dataframe of a shard, shared data is copied out of shared memory"""
+    if "frame" in shard_spec:
+        return shard_spec["frame"].reset_index(drop=True)
+
+    start, stop = shard_spec["start"], shard_spec["stop"]
+    columns = {column: shard_spec["pickled"][column].values for column in shard_spec["pickled"].columns}
+
+    for column, kind, dtype, array_specs in shard_spec["shared"]:
+        arrays = {}
+        for part, (block_name, array_dtype, length) in array_specs.items():
+            block = attach_block(block_name)
+            try:
+                arrays[part] = np.ndarray(length, dtype=array_dtype, buffer=block.buf)[start:stop].copy()
+            finally:
+                block.close()
+
+        if kind == "categorical":
+            columns[column] = pd.Categorical.from_codes(arrays["codes"], dtype=dtype)
+        elif kind == "masked":
+            columns[column] = dtype.construct_array_type()(arrays["data"], arrays["mask"])
+        else:
+            columns[column] = arrays["values"]
+
+    return pd.DataFrame(columns)[shard_spec["columns"]]
+
+
+def attach_block(block_name):
+    """Opens a shared memory block of share_frame, only its creator tracks it where supported"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=block_name, track=False)  # pylint: disable=unexpected-keyword-arg
+    return shared_memory.SharedMemory(name=block_name)
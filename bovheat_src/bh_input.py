@@ -1,10 +1,56 @@
 import argparse
+import datetime
+import hashlib
 import multiprocessing
 import os
-from itertools import starmap
+import pickle
+import shutil
+import warnings
 
 import pandas as pd
 
+from bovheat_src import bh_executor, bh_profile, bh_progress
+
+CACHE_DIRNAME = ".bovheat_cache"
+
+# file extensions of cleaned, calving annotated data written with --export_intermediate
+INTERMEDIATE_FORMATS = (".feather", ".parquet", ".pkl")
+
+# time layouts of SCR exports, e.g. 14:00 in 50 day and 2:00 PM in weekly exports
+TIME_FORMATS = ("%H:%M", "%I:%M %p", "%H:%M:%S", "%I:%M:%S %p")
+
+# seconds between two scans of the data folder with --watch
+WATCH_INTERVAL = 2.0
+
+# file extensions of the long heat table written with --export_results
+RESULT_FORMATS = (".csv", ".parquet")
+
+# columns of merged source data, see get_source_data
+SOURCE_COLUMNS = [
+    "Cow Number",
+    "Activity Change",
+    "Lactation Number",
+    "Days in Lactation",
+    "foldername",
+    "datetime",
+]
+
+INTERMEDIATE_COLUMNS = SOURCE_COLUMNS + ["calving_date"]
+
+# written if present, older intermediate files do not have them
+INTERMEDIATE_OPTIONAL_COLUMNS = ["calving_date_inconsistent"]
+
+# bump whenever read_clean_file returns differently shaped data, invalidates all cache entries
+CACHE_VERSION = 2
+
+# compact dtypes of the source data, foldername becomes categorical after merging all files
+SOURCE_SCHEMA = {
+    "Cow Number": "Int32",
+    "Activity Change": "float32",
+    "Lactation Number": "Int8",
+    "Days in Lactation": "Int16",
+}
+
 
 def get_start_parameters(args):
     # interactive mode
@@ -55,6 +101,45 @@ def get_args():
         help="Maximum number of consecutive missing values to fill. 0 disables interpolation",
     )
 
+    parser.add_argument(
+        "--executor",
+        type=str,
+        choices=list(bh_executor.EXECUTOR_KINDS),
+        default="process",
+        help="run parallel stages in processes or threads, serial disables parallel processing, \
+        default=process",
+    )
+
+    parser.add_argument(
+        "-f",
+        "--intermediate",
+        type=str,
+        metavar="FILE",
+        help="read cleaned data from a .feather, .parquet or .pkl file created with \
+        --export_intermediate instead of SCR files",
+    )
+
+    parser.add_argument(
+        "--export_intermediate",
+        type=str,
+        metavar="FILE",
+        help="write cleaned data to a .feather, .parquet or .pkl file, to be reused with --intermediate",
+    )
+
+    parser.add_argument(
+        "--export_results",
+        type=str,
+        metavar="FILE",
+        help="also write the long heat table to a .csv or .parquet file",
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"keep results per lactation in {CACHE_DIRNAME}, only lactations with changed data \
+        are recalculated and redrawn",
+    )
+
     parser.add_argument(
         "-l",
         "--language",
@@ -64,6 +149,18 @@ def get_args():
         help="language of column headings, default=eng",
     )
 
+    parser.add_argument(
+        "--no-pdf",
+        action="store_true",
+        help="do not write the PDF, matplotlib is not loaded",
+    )
+
+    parser.add_argument(
+        "--no-xlsx",
+        action="store_true",
+        help="do not write the xlsx file",
+    )
+
     parser.add_argument(
         "-x",
         "--x_axis_type",
@@ -76,11 +173,11 @@ def get_args():
     parser.add_argument(
         "-m",
         "--minheatlength",
-        type=int,
-        choices=range(1, 101),
-        metavar="[0-100]",
-        default=1,
-        help="minimum number of heat observations required to count as a heat, default=1",
+        type=parse_value_list,
+        metavar="[1-100]",
+        default=[1],
+        help="minimum number of heat observations required to count as a heat, default=1. \
+        Several values as list 1,2,3 or range start:stop:step start a sweep",
     )
 
     parser.add_argument(
@@ -100,14 +197,67 @@ def get_args():
         help="negative values are allowed",
     )
 
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="read and process one folder at a time, memory use is bounded by the largest folder",
+    )
+
+    parser.add_argument(
+        "--watch",
+        type=float,
+        nargs="?",
+        const=WATCH_INTERVAL,
+        metavar="SECONDS",
+        help=f"keep running and update the results whenever SCR files are added or changed, \
+        the folder is scanned every SECONDS, default={WATCH_INTERVAL:g}. Stop with Ctrl+C",
+    )
+
     parser.add_argument(
         "-t",
         "--threshold",
-        type=int,
-        choices=range(0, 101),
+        type=parse_value_list,
         metavar="[0-100]",
-        default=35,
-        help="threshold for heat detection, default=35",
+        default=[35],
+        help="threshold for heat detection, default=35. \
+        Several values as list 25,35 or range start:stop:step start a sweep, e.g. 25:50:5",
+    )
+
+    parser.add_argument(
+        "--reader",
+        type=str,
+        choices=["default", "fast"],
+        default="default",
+        help="fast: stream only the required columns of xlsx files, xls files need python-calamine, \
+        unreadable files fall back to default",
+    )
+
+    parser.add_argument(
+        "--cache",
+        type=str,
+        choices=["on", "off", "clear"],
+        default="on",
+        help=f"reuse parsed source files from {CACHE_DIRNAME}, off: bypass, clear: delete and rebuild, \
+        default=on",
+    )
+
+    parser.add_argument(
+        "--progress",
+        type=str,
+        choices=bh_progress.PROGRESS_MODES,
+        default="bar",
+        help="bar: one progress line per stage, json: progress as one JSON object per line, \
+        none: no progress output, default=bar",
+    )
+
+    parser.add_argument(
+        "--profile",
+        type=str,
+        nargs="?",
+        const="",
+        metavar="FILE",
+        help="print wall time, CPU time, peak memory, rows and groups of each stage, \
+        optionally write them to a .json FILE or a cProfile dump to a .prof/.pstats FILE",
     )
 
     args = parser.parse_args()
@@ -115,11 +265,44 @@ def get_args():
     if args.cores > multiprocessing.cpu_count():
         parser.error("Core count too high for this system.")
 
-    if args.interpolation_limit is not None:
-        if args.interpolation_limit < 0:
-            parser.error("Please choose a value greater or equal 0")
-        if args.interpolation_limit == 0:
-            args.interpolation_limit = None
+    if args.interpolation_limit is not None and args.interpolation_limit < 0:
+        parser.error("Please choose a value greater or equal 0")
+
+    for intermediate_file in (args.intermediate, args.export_intermediate):
+        if intermediate_file and not intermediate_file.endswith(INTERMEDIATE_FORMATS):
+            parser.error(f"Intermediate file has to end with one of {', '.join(INTERMEDIATE_FORMATS)}")
+
+    if args.profile and not args.profile.endswith(bh_profile.PROFILE_FORMATS):
+        parser.error(f"Profile file has to end with one of {', '.join(bh_profile.PROFILE_FORMATS)}")
+
+    if args.export_results and not args.export_results.endswith(RESULT_FORMATS):
+        parser.error(f"Result file has to end with one of {', '.join(RESULT_FORMATS)}")
+
+    if args.no_pdf and args.no_xlsx and not (args.export_intermediate or args.export_results):
+        parser.error(
+            "Nothing to write, combine --no-pdf and --no-xlsx with --export_intermediate or --export_results."
+        )
+
+    if args.intermediate and args.relative_path:
+        parser.error("Please choose either relative_path or --intermediate.")
+
+    if args.streaming and (args.intermediate or args.export_intermediate):
+        parser.error("--streaming can not be combined with --intermediate or --export_intermediate.")
+
+    if args.streaming and args.incremental:
+        parser.error("--streaming can not be combined with --incremental.")
+
+    if args.watch is not None:
+        if args.watch <= 0:
+            parser.error("Please choose a watch interval greater than 0 seconds.")
+        if args.streaming or args.intermediate or args.export_intermediate:
+            parser.error("--watch can not be combined with --streaming, --intermediate or --export_intermediate.")
+
+    if not all(0 <= threshold <= 100 for threshold in args.threshold):
+        parser.error("Please choose thresholds between 0 and 100.")
+
+    if not all(1 <= minheatlength <= 100 for minheatlength in args.minheatlength):
+        parser.error("Please choose minimum heat lengths between 1 and 100.")
 
     if args.startstop:
         if args.startstop[0] > args.startstop[1]:
@@ -128,6 +311,27 @@ def get_args():
     return args
 
 
+def parse_value_list(text):
+    """Parses 35, a list 25,35,45 or an inclusive range 25:50:5 into a sorted list of unique ints"""
+    try:
+        if ":" in text:
+            start, stop, step = (int(value) for value in text.split(":"))
+            if step < 1:
+                raise ValueError
+            values = range(start, stop + 1, step)
+        else:
+            values = [int(value) for value in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid value '{text}', use a number, a list 1,2,3 or a range start:stop:step"
+        ) from None
+
+    if not values:
+        raise argparse.ArgumentTypeError(f"range '{text}' is empty")
+
+    return sorted(set(values))
+
+
 # %%
 def get_userinput():
     while True:
@@ -152,37 +356,204 @@ def get_userinput():
                 "language": language,
                 "start_dim": start_dim,
                 "stop_dim": stop_dim,
-                "threshold": threshold,
-                "minheatlength": minheatlength,
+                "threshold": [threshold],
+                "minheatlength": [minheatlength],
             }
 
 
-def read_clean_file(root, file_name, translation_table):
+@bh_profile.profiled("read_clean_file", count=bh_profile.count_rows)
+def read_clean_file(root, file_name, translation_table, reader="default"):
     try:
-        data = pd.read_excel(
-            os.path.join(root, file_name),
-            usecols=list(translation_table.keys()),
-            sheet_name=0,
-        )
+        data = read_source_table(os.path.join(root, file_name), list(translation_table.keys()), reader)
     except:
         print(f"\r{file_name} ...SKIPPED")
         return None
 
-    print(f"\r{file_name}", end="".ljust(20))
+    return clean_source_table(data, os.path.basename(root), translation_table)
+
+
+def clean_source_table(data, foldername, translation_table):
+    """Renames the columns of a read source table, drops empty rows and builds datetime"""
     data.rename(columns=translation_table, inplace=True)
 
     # removes empty rows, including possible footers rows
     data.dropna(subset=["Cow Number", "Time"], inplace=True)
 
-    data["foldername"] = os.path.basename(root)
+    data["foldername"] = foldername
+
+    data["datetime"] = build_datetime(data["Date"], data["Time"])
+
+    # raw Date and Time are superseded by datetime
+    data.drop(columns=["Date", "Time"], inplace=True)
+
+    return apply_source_schema(data)
+
+
+def build_datetime(dates, times):
+    """Combines the Date and Time columns of a source table into datetimes.
+
+    SCR exports have Excel date cells and times as text, e.g. 14:00 or 2:00 PM, or as time cells.
+    The time format is detected once per file and only distinct times are parsed. Other layouts
+    are parsed element by element from the text of both columns.
+    """
+    midnight_dates = get_midnight_dates(dates)
+    time_offsets = get_time_offsets(times)
+
+    if midnight_dates is None or time_offsets is None:
+        return pd.to_datetime(dates.astype(str) + " " + times.astype(str), format="mixed")
+
+    return midnight_dates + time_offsets
+
+
+def get_midnight_dates(dates):
+    """Returns dates as datetime64 if all are valid dates without time of day, otherwise None"""
+    if pd.api.types.is_datetime64_dtype(dates.dtype):
+        midnight_dates = dates
+    elif pd.api.types.infer_dtype(dates, skipna=False) in ("datetime", "date"):
+        midnight_dates = pd.to_datetime(dates)
+    else:
+        return None
+
+    if midnight_dates.isna().any() or (midnight_dates != midnight_dates.dt.normalize()).any():
+        return None
+    return midnight_dates
+
+
+def get_time_offsets(times):
+    """Returns times as timedelta since midnight, None if the time layout is not recognised"""
+    time_kind = pd.api.types.infer_dtype(times, skipna=False)
+    if time_kind not in ("string", "time"):
+        return None
+
+    codes, unique_times = pd.factorize(times)
+    if time_kind == "time":
+        unique_offsets = pd.to_timedelta(
+            [
+                datetime.timedelta(
+                    hours=time.hour, minutes=time.minute, seconds=time.second, microseconds=time.microsecond
+                )
+                for time in unique_times
+            ]
+        )
+    else:
+        unique_offsets = None
+        for time_format in TIME_FORMATS:
+            parsed_times = pd.to_datetime(unique_times, format=time_format, errors="coerce")
+            if not parsed_times.isna().any():
+                unique_offsets = parsed_times - parsed_times.normalize()
+                break
+        if unique_offsets is None:
+            return None
+
+    return pd.Series(unique_offsets.take(codes), index=times.index)
+
+
+def read_source_table(path, columns, reader="default"):
+    """Reads columns of the first sheet of a source file.
+
+    The fast reader streams only the requested columns, it falls back to pd.read_excel
+    for files it can not read, e.g. unexpected layouts or .xls files without python-calamine.
+    """
+    if reader == "fast":
+        # openpyxl is imported only for the fast reader, pd.read_excel loads its engines on demand
+        from bovheat_src import bh_excel  # pylint: disable=import-outside-toplevel
 
-    data["datetime"] = pd.to_datetime(data["Date"].astype(str) + " " + data["Time"].astype(str), format='mixed')
+        data = bh_excel.read_excel_fast(path, columns)
+        if data is not None:
+            return data
+
+    return pd.read_excel(path, usecols=columns, sheet_name=0)
+
+
+def apply_source_schema(data):
+    """Converts source columns to the compact dtypes of SOURCE_SCHEMA.
+
+    Columns that can not be converted, e.g. non integer cow numbers, keep their dtype.
+    """
+    for column, dtype in SOURCE_SCHEMA.items():
+        try:
+            data[column] = data[column].astype(dtype)
+        except (TypeError, ValueError, OverflowError):
+            pass
 
     return data
 
 
+def get_cache_entry_path(cache_dir, root, file_name, translation_table, reader="default"):
+    """Returns path of the cache entry for one source file.
+
+    One entry per source file and reader, so a changed file overwrites its own outdated entry.
+    """
+    entry_id = repr((os.path.abspath(os.path.join(root, file_name)), sorted(translation_table.items()), reader))
+    return os.path.join(cache_dir, hashlib.sha1(entry_id.encode("utf-8")).hexdigest() + ".pkl")
+
+
+def get_file_fingerprint(root, file_name):
+    stat = os.stat(os.path.join(root, file_name))
+    return (CACHE_VERSION, stat.st_size, stat.st_mtime_ns)
+
+
+def read_cached_file(root, file_name, translation_table, cache_dir, reader="default"):
+    """Reads source file from cache if unchanged, otherwise parses it and updates the cache.
+
+    Cache entries are keyed on path, column translation table, reader, file size and modification
+    time.
+    Unreadable cache entries are ignored and rebuilt, a cache that cannot be written is skipped with a
+    warning. No cache is used if cache_dir is None.
+    """
+    if cache_dir is None:
+        return read_clean_file(root, file_name, translation_table, reader)
+
+    entry_path = get_cache_entry_path(cache_dir, root, file_name, translation_table, reader)
+    fingerprint = get_file_fingerprint(root, file_name)
+
+    try:
+        with open(entry_path, "rb") as entry_file:
+            cached_fingerprint, data = pickle.load(entry_file)
+        if cached_fingerprint == fingerprint:
+            return data
+    except Exception:  # pylint: disable=broad-except
+        pass
+
+    data = read_clean_file(root, file_name, translation_table, reader)
+
+    if data is not None:
+        # write to temporary file first, parallel readers never see partial entries
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as entry_file:
+                pickle.dump((fingerprint, data), entry_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry_path)
+        except OSError as error:
+            # read-only folders or a file named like the cache only disable caching, same message
+            # for every file so the warning is shown once
+            warnings.warn(f"Cache {cache_dir} is not writable ({error.strerror}), files are not cached.")
+
+    return data
+
+
+def clear_cache(cache_dir):
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+        print(f"Cache {cache_dir} cleared.")
+
+
+def get_core_count(core_count):
+    """Resolves the --cores option, 0: auto (max available -1, at least 1), n: fixed core amount"""
+    if core_count == 0:
+        return max(multiprocessing.cpu_count() - 1, 1)
+    return core_count
+
+
+def get_executor(core_count=0, kind="process"):
+    """Returns an executor for the --cores and --executor options, see bh_executor.Executor"""
+    return bh_executor.Executor(kind, get_core_count(core_count))
+
+
 # %%
-def get_source_data(language, core_count=0, relative_path=""):
+@bh_profile.profiled("get_source_data", count=bh_profile.count_rows)
+def get_source_data(language, core_count=0, relative_path="", cache="off", reader="default", executor=None):
     """Reads all .xslx and .xls files in current directory and merges into one dataframe.
 
     Files have to include the following column headers names:
@@ -207,6 +578,16 @@ def get_source_data(language, core_count=0, relative_path=""):
     relative_path : str
         Specify optional relative path
 
+    cache : str
+        on: reuse unchanged parsed files from .bovheat_cache, off: parse all files,
+        clear: delete cache and rebuild it
+
+    reader : str
+        default: pd.read_excel, fast: stream only the required columns, see bh_excel
+
+    executor : bh_executor.Executor
+        Optional executor to reuse, otherwise a new one is started for core_count
+
     Returns
     -------
     dataframe : pandas.DataFrame()
@@ -214,6 +595,19 @@ def get_source_data(language, core_count=0, relative_path=""):
 
     """
 
+    file_list = get_file_list(language, relative_path=relative_path, cache=cache, reader=reader)
+
+    return read_files(file_list, core_count=core_count, executor=executor)
+
+
+def get_file_list(language, relative_path="", cache="off", reader="default", verbose=True):
+    """Searches relative_path and its subfolders for SCR files, verbose prints folder and file count.
+
+    Returns
+    -------
+    list
+        Arguments of read_cached_file for each file, (root, file name, translation table, cache dir, reader)
+    """
     folderpath = os.path.join(os.getcwd(), relative_path)
 
     # right hand side are mandatory column headers
@@ -239,33 +633,173 @@ def get_source_data(language, core_count=0, relative_path=""):
     if language == "ger":
         translation_table = translation_german
 
+    cache_dir = os.path.join(folderpath, CACHE_DIRNAME)
+    if cache == "clear":
+        clear_cache(cache_dir)
+
+    if cache == "off":
+        cache_dir = None
+
     file_list = []
-    print(f"Searching for files in directory {folderpath}:")
-    for root, _, files in os.walk(folderpath):
+    if verbose:
+        print(f"Searching for files in directory {folderpath}:")
+    for root, dirs, files in os.walk(folderpath):
+        dirs[:] = [name for name in dirs if name != CACHE_DIRNAME]
         for name in files:
             if name.endswith((".xlsx", ".xls")) and not name.startswith((".", "~", "BovHEAT")):
-                file_list.append((root, name, translation_table))
+                file_list.append((root, name, translation_table, cache_dir, reader))
 
-    print(len(file_list), "files found.", end="")
+    if verbose:
+        print(len(file_list), "files found.", end="")
 
-    if core_count == 1:  # do not use multiprocessing
-        print(f"Reading with {core_count} core(s) ...")
-        df_list = list(starmap(read_clean_file, file_list))
-    else:
-        if core_count == 0:  # auto core count selection
-            read_cores = multiprocessing.cpu_count() - 1
-        else:  # core count fixed
-            read_cores = core_count
+    return file_list
+
+
+def get_folder_file_lists(file_list):
+    """Splits a file list from get_file_list by foldername, sorted by foldername
 
-        print(f"Reading with {read_cores} core(s) ...")
-        with multiprocessing.Pool(processes=read_cores) as pool:
-            df_list = pool.starmap(read_clean_file, file_list)
+    Returns
+    -------
+    list
+        (foldername, file list) tuples
+    """
+    folder_files = {}
+    for file_args in file_list:
+        folder_files.setdefault(os.path.basename(file_args[0]), []).append(file_args)
 
-    valids_df = [df for df in df_list if isinstance(df, pd.DataFrame)]
-    if len(valids_df) < 1:
+    return sorted(folder_files.items())
+
+
+def read_files(file_list, core_count=0, executor=None):
+    """Reads all files of a file list from get_file_list and merges them into one dataframe.
+
+    Largest files are read first, so no large file is left over while other workers idle.
+    The merged dataframe keeps the order of file_list.
+    """
+    if executor is None:
+        with get_executor(core_count) as new_executor:
+            return read_files(file_list, executor=new_executor)
+
+    return merge_file_frames(read_file_frames(file_list, executor))
+
+
+def read_file_frames(file_list, executor):
+    """Reads all files of a file list from get_file_list, largest first.
+
+    Returns
+    -------
+    list
+        dataframe of every file in file_list order, None for unreadable files
+    """
+    print(f"Reading with {executor.worker_count} core(s) ...")
+    tasks = sorted(enumerate(file_list), key=lambda task: get_file_size(*task[1][:2]), reverse=True)
+    file_columns = {}
+    with bh_progress.Progress("Reading files", total=len(tasks), unit="files") as progress:
+        for file_no, columns in bh_profile.imap_recorded(executor, read_file_columns, tasks):
+            file_columns[file_no] = columns
+            progress.update()
+
+    return [
+        None if file_columns[file_no] is None
+        else pd.DataFrame(file_columns[file_no][1], index=file_columns[file_no][0])
+        for file_no in range(len(file_list))
+    ]
+
+
+def merge_file_frames(file_dfs):
+    """Merges dataframes of read_file_frames into one dataframe, unreadable files are left out"""
+    df_list = [file_df for file_df in file_dfs if file_df is not None]
+    if len(df_list) < 1:
         raise Exception("No files found or readable.")
 
-    # None items are silently dropped by concat
     sum_df = pd.concat(df_list, axis=0, sort=False)
+    sum_df["foldername"] = sum_df["foldername"].astype("category")
 
     return sum_df
+
+
+def get_file_size(root, file_name):
+    try:
+        return os.stat(os.path.join(root, file_name)).st_size
+    except OSError:
+        return 0
+
+
+def read_file_columns(task):
+    """Reads one file of read_files, returns (file number, (index, {column: array})) or (file number, None).
+
+    Workers send column arrays instead of a dataframe, the constant foldername is sent as categorical.
+    """
+    file_no, file_args = task
+    data = read_cached_file(*file_args)
+    if data is None:
+        return file_no, None
+
+    data["foldername"] = data["foldername"].astype("category")
+
+    return file_no, (data.index.to_numpy(), {column: data[column].array for column in data.columns})
+
+
+def get_source_frame(source):
+    """Source data for bovheat.analyze from a dataframe or from column arrays, the input is not changed.
+
+    Parameters
+    ----------
+    source : pandas.DataFrame or dict
+        Columns of SOURCE_COLUMNS, e.g. from get_source_data or read_intermediate, or a dict of
+        arrays. Scalars in a dict are used for all rows, e.g. one foldername.
+
+    Returns
+    -------
+    dataframe : pandas.DataFrame()
+        Source data with the dtypes of get_source_data
+    """
+    data = source.copy(deep=False) if isinstance(source, pd.DataFrame) else pd.DataFrame(source)
+
+    missing_columns = [column for column in SOURCE_COLUMNS if column not in data.columns]
+    if missing_columns:
+        raise ValueError(f"Source data is missing columns: {', '.join(missing_columns)}")
+
+    if not pd.api.types.is_datetime64_dtype(data["datetime"]):
+        data["datetime"] = pd.to_datetime(data["datetime"])
+    data = apply_source_schema(data)
+    if not isinstance(data["foldername"].dtype, pd.CategoricalDtype):
+        data["foldername"] = data["foldername"].astype("category")
+
+    return data
+
+
+def read_intermediate(filename):
+    """Reads cleaned, calving annotated data written by bh_output.write_intermediate.
+
+    .feather and .parquet files require pyarrow to be installed.
+
+    Parameters
+    ----------
+    filename : str
+        Path to .feather, .parquet or .pkl file
+
+    Returns
+    -------
+    dataframe : pandas.DataFrame()
+        Cleaned data including calving_date, ready for bovheat.cut_time_window
+    """
+    print(f"Reading intermediate file {filename}")
+
+    if filename.endswith(".feather"):
+        data = pd.read_feather(filename)
+    elif filename.endswith(".parquet"):
+        data = pd.read_parquet(filename)
+    elif filename.endswith(".pkl"):
+        data = pd.read_pickle(filename)
+    else:
+        raise Exception(f"Unknown intermediate file format: {filename}")
+
+    missing_columns = [column for column in INTERMEDIATE_COLUMNS if column not in data.columns]
+    if missing_columns:
+        raise Exception(f"Intermediate file is missing columns: {', '.join(missing_columns)}")
+
+    data = apply_source_schema(data)
+    data["foldername"] = data["foldername"].astype("category")
+
+    return data
@@ -1,177 +1,526 @@
-import matplotlib.pyplot as plt
+import contextlib
+import io
+import os
+import tempfile
+
+import numpy as np
 import pandas as pd
-from matplotlib.backends.backend_pdf import PdfPages
 
+from bovheat_src import bh_input, bh_profile, bh_progress
+
+PDF_GROUP_KEYS = ["foldername", "Cow Number", "lactation_adj"]
+# columns of the wide sheet that are the same for all heats of a lactation
+WIDE_ROW_KEYS = PDF_GROUP_KEYS + ["calving_date", "act_usable", "act_max", "heat_count"]
+
+# same cell styles as DataFrame.to_excel
+XLSX_HEADER_FORMAT = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+XLSX_DATETIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+# day 0 of Excel serial dates, valid from March 1900 on
+XLSX_EPOCH = pd.Timestamp("1899-12-30")
+
+# values measured per column by get_col_widths, besides minimum and maximum
+COL_WIDTH_SAMPLE_SIZE = 1000
+
+
+def write_intermediate(calved_df, filename):
+    """Writes cleaned, calving annotated data to a columnar file, see bh_input.read_intermediate"""
+    columns = bh_input.INTERMEDIATE_COLUMNS + [
+        column for column in bh_input.INTERMEDIATE_OPTIONAL_COLUMNS if column in calved_df.columns
+    ]
+    intermediate_df = calved_df[columns].reset_index(drop=True)
+
+    if filename.endswith(".feather"):
+        intermediate_df.to_feather(filename)
+    elif filename.endswith(".parquet"):
+        intermediate_df.to_parquet(filename, index=False)
+    else:
+        intermediate_df.to_pickle(filename)
+
+    print(f"# Intermediate: {filename} created.")
 
+
+def count_heats(result, heats_df, *args, **kwargs):
+    """Counter for bh_profile.profiled, heat rows and lactations written"""
+    return len(heats_df), heats_df.groupby(PDF_GROUP_KEYS, observed=True).ngroups
+
+
+@bh_profile.profiled("write_xlsx", count=count_heats)
 def write_xlsx(final_df, filename):
+    """Writes the long and wide heat tables, rows are streamed in xlsxwriter's constant_memory mode"""
+    import xlsxwriter  # pylint: disable=import-outside-toplevel
+
     filename += ".xlsx"
 
     writedf_dict = {"long": final_df, "wide": calc_long_to_wide(final_df)}
 
-    with pd.ExcelWriter(filename, engine="xlsxwriter") as writer:
-        for name, df in writedf_dict.items():
-            df.to_excel(writer, sheet_name=name, index=False)
-            worksheet = writer.sheets[name]
-            for i, width in enumerate(get_col_widths(df)):
-                worksheet.set_column(i - 1, i - 1, width)
+    workbook = xlsxwriter.Workbook(filename, {"constant_memory": True})
+    header_format = workbook.add_format(XLSX_HEADER_FORMAT)
+    datetime_format = workbook.add_format({"num_format": XLSX_DATETIME_FORMAT})
+
+    for name, df in writedf_dict.items():
+        write_xlsx_sheet(workbook.add_worksheet(name), df, header_format, datetime_format)
+
+    workbook.close()
 
     print(f"# XLSX: {filename} created.")
 
 
-def calc_long_to_wide(final_df):
-    wide_df = final_df.copy(deep=True)
-
-    wide_df.set_index(
-        [
-            "foldername",
-            "Cow Number",
-            "lactation_adj",
-            "calving_date",
-            "act_usable",
-            "act_max",
-            "heat_count",
-            "heat_no",
-        ],
-        inplace=True,
-    )
-
-    wide_df = wide_df.unstack("heat_no")
-    wide_df = wide_df.sort_index(axis=1, level=1)
-
-    #
-    wide_df.drop(
-        columns=[name_tuple for name_tuple in wide_df.columns if pd.isna(name_tuple[1])],
-        inplace=True,
-    )
-    wide_df.columns = [f"{name}{heat_no}" for name, heat_no in wide_df.columns]
-    wide_df.reset_index(inplace=True)
-
-    return wide_df
-
-
-def get_col_widths(dataframe):
-    idx_max = max([len(str(s)) for s in dataframe.index.values] + [len(str(dataframe.index.name))])
-    return [idx_max] + [
-        max([len(str(s)) for s in dataframe[col].values] + [len(col)]) for col in dataframe.columns
-    ]
+def write_xlsx_sheet(worksheet, df, header_format, datetime_format):
+    """Writes df with header, row after row as required by constant_memory mode.
 
+    Cells look like those of DataFrame.to_excel, missing values are left empty.
+    """
+    for col_no, width in enumerate(get_col_widths(df)):
+        worksheet.set_column(col_no, col_no, width)
 
-def write_pdf(heats_df, sections_df, threshold, filename, x_axis_type):
+    worksheet.write_row(0, 0, [str(column) for column in df.columns], header_format)
+
+    cell_writers = []
+    columns = []
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            # Excel serial dates, converted at once instead of per cell by write_datetime
+            values = (values - XLSX_EPOCH) / pd.Timedelta(days=1)
+            cell_writers.append((worksheet.write_number, datetime_format))
+        elif pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+            cell_writers.append((worksheet.write_number, None))
+        else:
+            cell_writers.append((worksheet.write, None))
+
+        # python objects with None for missing values, converted once per column
+        columns.append(values.astype(object).where(values.notna(), None).tolist())
+
+    for row_no, row in enumerate(zip(*columns), start=1):
+        for col_no, value in enumerate(row):
+            if value is not None:
+                write_cell, cell_format = cell_writers[col_no]
+                write_cell(row_no, col_no, value, cell_format)
+
+
+@bh_profile.profiled("write_results", count=count_heats)
+def write_results(final_df, filename):
+    """Writes the long heat table to a .csv or .parquet file, .parquet requires pyarrow"""
+    if filename.endswith(".parquet"):
+        final_df.to_parquet(filename, index=False)
+    else:
+        final_df.to_csv(filename, index=False, date_format="%Y-%m-%d %H:%M:%S")
+
+    print(f"# Results: {filename} created.")
+
+
+def calc_long_to_wide(final_df):
+    """One row per lactation, the fields of every heat become columns like start_dt_heat1.
+
+    Rows are sorted by the lactation columns. The output arrays are allocated once per field and
+    the fields of each long row are scattered to their (lactation row, heat_no) position.
+    """
+    # parameter columns of a sweep identify the lactation as well
+    sweep_columns = [name for name in ["threshold", "minheatlength"] if name in final_df.columns]
+    row_keys = sweep_columns + WIDE_ROW_KEYS
+    heat_columns = sorted(name for name in final_df.columns if name not in row_keys + ["heat_no"])
+
+    # the other row columns are the same for all rows of a lactation
+    lactation_keys = sweep_columns + PDF_GROUP_KEYS
+    row_numbers = final_df.groupby(lactation_keys, sort=True, dropna=False, observed=True).ngroup().to_numpy()
+    row_count = row_numbers.max() + 1 if len(final_df) else 0
+    # first long row of every lactation, assigned in reverse so the first one is kept
+    first_rows = np.empty(row_count, dtype=np.intp)
+    first_rows[row_numbers[::-1]] = np.arange(len(final_df))[::-1]
+
+    has_heat = final_df["heat_no"].notna().to_numpy()
+    heat_nos, heat_slots = np.unique(final_df["heat_no"].to_numpy()[has_heat], return_inverse=True)
+    positions = heat_slots * row_count + row_numbers[has_heat]
+    is_complete = len(positions) == row_count * len(heat_nos)
+
+    # one contiguous row per heat_no, becomes a column of the wide table
+    heat_arrays = {}
+    for name in heat_columns:
+        values = final_df[name].to_numpy()[has_heat]
+        heat_array = get_wide_array(values.dtype, (len(heat_nos), row_count), is_complete)
+        heat_array.reshape(-1)[positions] = values
+        heat_arrays[name] = heat_array
+
+    wide_columns = dict(final_df[row_keys].iloc[first_rows].reset_index(drop=True).items())
+    for slot, heat_no in enumerate(heat_nos):
+        for name in heat_columns:
+            heat_column = heat_arrays[name][slot]
+            if heat_column.dtype == object:
+                # explicit dtype, object fields are not converted to datetimes
+                heat_column = pd.Series(heat_column, dtype=object)
+            wide_columns[f"{name}{int(heat_no)}"] = heat_column
+
+    # the arrays are used as columns without copying them into blocks
+    return pd.DataFrame(wide_columns, copy=False)
+
+
+def get_wide_array(dtype, shape, is_complete):
+    """Output array of calc_long_to_wide, filled with NaN or NaT unless every heat cell is set.
+
+    Like DataFrame.unstack, integer fields become float and other fields object if cells are missing.
+    """
+    if is_complete:
+        return np.empty(shape, dtype=dtype)
+    if dtype.kind in "mM":
+        return np.full(shape, np.array("NaT", dtype=dtype))
+    if dtype.kind in "iuf":
+        return np.full(shape, np.nan, dtype=dtype if dtype.kind == "f" else np.float64)
+    return np.full(shape, np.nan, dtype=object)
+
+
+def get_col_widths(dataframe, sample_size=COL_WIDTH_SAMPLE_SIZE):
+    """Width of every column, the longest text of header, minimum, maximum and a sample of values.
+
+    String lengths are computed with vectorized string methods, categorical columns only measure
+    their categories and datetimes have the fixed width of XLSX_DATETIME_FORMAT.
+    """
+    widths = []
+    for column in dataframe.columns:
+        values = dataframe[column].dropna()
+        if values.empty:
+            width = 0
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            width = values.cat.categories.astype(str).str.len().max()
+        elif pd.api.types.is_datetime64_any_dtype(values.dtype):
+            width = len(XLSX_DATETIME_FORMAT)
+        else:
+            positions = np.linspace(0, len(values) - 1, min(len(values), sample_size)).astype(int)
+            sample = values.iloc[positions]
+            if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+                sample = pd.concat([sample, pd.Series([values.min(), values.max()], dtype=values.dtype)])
+            width = sample.astype(str).str.len().max()
+        widths.append(max(int(width), len(str(column))))
+
+    return widths
+
+
+@bh_profile.profiled("write_pdf", count=count_heats)
+def write_pdf(heats_df, sections_df, threshold, filename, x_axis_type, core_count=1, executor=None):
+    """Writes one PDF page per lactation.
+
+    With a process executor of more than one worker, contiguous chunks of lactations are rendered
+    into partial PDFs in parallel and merged in the original order. Merging requires pypdf, without
+    it pages are rendered sequentially. Without executor, a new one is started for core_count.
+    """
+    if executor is None:
+        executor_context = bh_input.get_executor(core_count)
+    else:
+        executor_context = contextlib.nullcontext(executor)
 
     filename += ".pdf"
 
-    pdf_file = PdfPages(filename)  # Start PDF file
+    page_count = heats_df.groupby(PDF_GROUP_KEYS, observed=True).ngroups
 
-    if x_axis_type == 'dim':
-        build_pdf_page = build_pdf_page_dim
-    elif x_axis_type == 'dt':
-        build_pdf_page = build_pdf_page_dt
-
-    heats_df.groupby(["foldername", "Cow Number", "lactation_adj"]).apply(
-        lambda df: build_pdf_page(
-            cowdf=sections_df[
-                (sections_df["foldername"].isin(df["foldername"]))
-                & (sections_df["Cow Number"].isin(df["Cow Number"]))
-                & (sections_df["lactation_adj"].isin(df["lactation_adj"]))
-            ],
-            heats_df=df,
-            pdf_file=pdf_file,
-            threshold=threshold,
-        )
-    )
+    with executor_context as executor, bh_progress.Progress("Writing PDF", page_count, "pages") as progress:
+        # pyplot is not thread safe, threads render sequentially
+        pdf_cores = executor.worker_count if executor.kind == "process" else 1
 
-    pdf_file.close()  # closing pdf
+        if pdf_cores > 1 and len(heats_df) > 1:
+            if not can_merge_pdf():
+                print("pypdf is not installed, writing PDF with 1 core(s) ...")
+                pdf_cores = 1
+        else:
+            pdf_cores = 1
+
+        if pdf_cores == 1:
+            write_pdf_pages(heats_df, sections_df, threshold, filename, x_axis_type, progress)
+        else:
+            write_pdf_parallel(heats_df, sections_df, threshold, filename, x_axis_type, executor, progress)
 
     print(f"\n# PDF: {filename} created.")
 
 
-def build_pdf_page_dt(cowdf, heats_df, pdf_file, threshold):
-    print(
-        "\r Building PDF for", cowdf["foldername"].iloc[0], cowdf["Cow Number"].iloc[0], end="",
-    )
+def can_merge_pdf():
+    """Merging PDF files requires the optional pypdf package"""
+    try:
+        import pypdf  # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError:
+        return False
+    return True
 
-    cownumber = cowdf["Cow Number"].iloc[0]
-    foldername = cowdf["foldername"].iloc[0]
-    lactation_no = cowdf["lactation_adj"].iloc[0]
 
-    plt.style.use("ggplot")
-    _, ax = plt.subplots(figsize=(14, 6))
+def write_pdf_parallel(heats_df, sections_df, threshold, filename, x_axis_type, executor, progress=None):
+    import pypdf  # pylint: disable=import-outside-toplevel
 
-    cowdf.plot(
-        ax=ax,
-        kind="line",
-        x="datetime",
-        y="Activity Change",
-        title=f"{foldername} : {cownumber:.0f}_L{lactation_no:.0f}  % "
-        f"{heats_df['act_usable'].iloc[0]:.2f}",
-    )
+    pdf_cores = executor.worker_count
+    print(f"Writing PDF with {pdf_cores} core(s) ...")
 
-    ax.set_ylim([-50, 110])
+    # contiguous chunks in page order, pages of one lactation stay together
+    lactation_ids = heats_df.groupby(PDF_GROUP_KEYS, sort=True, observed=True).ngroup()
+    lactation_count = lactation_ids.max() + 1
 
-    # Horizontal threshold line
-    ax.axhline(threshold, label=f"{threshold}_thresh", color="black", linestyle=":")
+    chunk_count = min(pdf_cores, lactation_count)
+    chunk_of_lactation = lactation_ids * chunk_count // lactation_count
+    section_keys = pd.MultiIndex.from_frame(sections_df[PDF_GROUP_KEYS])
 
-    calving_date = cowdf["calving_date"].iloc[0]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        chunk_args = []
+        for chunk_no in range(chunk_count):
+            heats_chunk_df = heats_df[chunk_of_lactation == chunk_no]
+            sections_chunk_df = sections_df[
+                section_keys.isin(pd.MultiIndex.from_frame(heats_chunk_df[PDF_GROUP_KEYS]))
+            ]
+            part_filename = os.path.join(tmp_dir, f"part{chunk_no}.pdf")
+            chunk_args.append((heats_chunk_df, sections_chunk_df, threshold, part_filename, x_axis_type))
 
-    if cowdf["datetime"].isin([calving_date]).any():
-        ax.axvline(
-            calving_date + pd.Timedelta(hours=1), label="calving", color="black", linestyle="-",
+        chunk_page_counts = np.bincount(
+            np.arange(lactation_count) * chunk_count // lactation_count, minlength=chunk_count
         )
+        part_filenames = {}
+        for chunk_no, part_filename in executor.imap_unordered(write_pdf_chunk, enumerate(chunk_args)):
+            part_filenames[chunk_no] = part_filename
+            if progress is not None:
+                progress.update(int(chunk_page_counts[chunk_no]))
 
-    for _, heat in heats_df[heats_df["heat_no"] > 0].groupby(["heat_no"]):
-        ax.axvspan(
-            heat["start_dt_heat"].iloc[0], heat["stop_dt_heat"].iloc[0], alpha=0.1, color="red",
-        )
+        merger = pypdf.PdfWriter()
+        for chunk_no in range(chunk_count):
+            merger.append(part_filenames[chunk_no])
+        merger.write(filename)
+        merger.close()
 
-    plt.legend(loc="best")
-    plt.savefig(pdf_file, bbox_inches="tight", format="pdf")
 
-    plt.close()
+def write_pdf_chunk(task):
+    """Renders one chunk of write_pdf_parallel, returns (chunk number, filename)"""
+    chunk_no, chunk_args = task
+    return chunk_no, write_pdf_pages(*chunk_args)
 
-def build_pdf_page_dim(cowdf, heats_df, pdf_file, threshold):
-    print(
-        "\r Building PDF for", cowdf["foldername"].iloc[0], cowdf["Cow Number"].iloc[0], end="",
-        )
 
-    cownumber = cowdf["Cow Number"].iloc[0]
-    foldername = cowdf["foldername"].iloc[0]
-    lactation_no = cowdf["lactation_adj"].iloc[0]
-    calving_date = cowdf["calving_date"].iloc[0]
-    cowdf["DIM"] = (cowdf["datetime"] - calving_date).dt.total_seconds() / (60 * 60 * 24)
+def write_pdf_pages(heats_df, sections_df, threshold, filename, x_axis_type, progress=None):
+    """Renders the pages of all lactations in heats_df sequentially into filename"""
+    pdf_file = open_pdf(filename)  # Start PDF file
 
+    add_pdf_pages(pdf_file, heats_df, sections_df, threshold, x_axis_type, progress)
 
-    plt.style.use("ggplot")
-    _, ax = plt.subplots(figsize=(14, 6))
+    pdf_file.close()  # closing pdf
 
-    cowdf.plot(
-        ax=ax,
-        kind="line",
-        x= "DIM",
-        y="Activity Change",
-        title=f"{foldername} : {cownumber:.0f}_L{lactation_no:.0f}  % "
-              f"{heats_df['act_usable'].iloc[0]:.2f}",
-        )
+    return filename
 
-    ax.set_ylim([-50, 110])
 
-    # Horizontal threshold line
-    ax.axhline(threshold, label=f"{threshold}_thresh", color="black", linestyle=":")
+def open_pdf(filename):
+    # matplotlib is imported when the first PDF is written, runs without PDF start faster
+    from matplotlib.backends.backend_pdf import PdfPages  # pylint: disable=import-outside-toplevel
 
+    return PdfPages(filename)
 
-    if 0 in cowdf["Days in Lactation"].values:
-        ax.axvline(
-            0, label="calving", color="black", linestyle="-",
-            )
 
-    for _, heat in heats_df[heats_df["heat_no"] > 0].groupby(["heat_no"]):
-        # Calculate DIM for start and stop of each heat
-        start_dim = (heat["start_dt_heat"].iloc[0] - calving_date).total_seconds() / (60 * 60 * 24)
-        stop_dim = (heat["stop_dt_heat"].iloc[0] - calving_date).total_seconds() / (60 * 60 * 24)
+def add_pdf_pages(pdf_file, heats_df, sections_df, threshold, x_axis_type, progress=None):
+    """Renders the pages of all lactations in heats_df into an open PDF file, pages are counted in progress"""
+    with PdfPageRenderer(threshold, x_axis_type) as renderer:
+        for _, lactation_heats_df, cowdf in get_pdf_pages(heats_df, sections_df, x_axis_type):
+            renderer.draw_page(cowdf, lactation_heats_df, pdf_file)
+            if progress is not None:
+                progress.update()
+
+
+def render_pdf_pages(heats_df, sections_df, threshold, x_axis_type, progress=None):
+    """Renders every lactation in heats_df into its own single page PDF, pages are counted in progress
+
+    Returns:
+        dict -- {(foldername, Cow Number, lactation_adj): PDF bytes}
+    """
+    pages = {}
+    with PdfPageRenderer(threshold, x_axis_type) as renderer:
+        for lactation, lactation_heats_df, cowdf in get_pdf_pages(heats_df, sections_df, x_axis_type):
+            page_buffer = io.BytesIO()
+            with open_pdf(page_buffer) as pdf_file:
+                renderer.draw_page(cowdf, lactation_heats_df, pdf_file)
+            pages[lactation] = page_buffer.getvalue()
+            if progress is not None:
+                progress.update()
+
+    return pages
+
+
+def write_pdf_from_pages(pages, filename):
+    """Merges single page PDFs from render_pdf_pages into filename, requires pypdf"""
+    import pypdf  # pylint: disable=import-outside-toplevel
+
+    merger = pypdf.PdfWriter()
+    for page in pages:
+        merger.append(io.BytesIO(page))
+    merger.write(filename)
+    merger.close()
+
+    print(f"\n# PDF: {filename} created.")
+
+
+def get_pdf_pages(heats_df, sections_df, x_axis_type):
+    """Yields lactation, heats and sections of every page in page order"""
+    sorted_sections_df, section_index = get_section_index(sections_df)
+
+    if x_axis_type == 'dim':
+        sorted_sections_df["DIM"] = calc_dim(sorted_sections_df["datetime"], sorted_sections_df["calving_date"])
+
+    for lactation, lactation_heats_df in heats_df.groupby(PDF_GROUP_KEYS, observed=True):
+        yield lactation, lactation_heats_df, sorted_sections_df.iloc[section_index[lactation]]
+
+
+def get_section_index(sections_df):
+    """Sorts sections by lactation and indexes the row range of every lactation.
+
+    Returns:
+        (pd.DataFrame, dict) -- sorted sections, {(foldername, Cow Number, lactation_adj): slice}
+    """
+    sorted_sections_df = sections_df.sort_values(PDF_GROUP_KEYS, kind="stable").reset_index(drop=True)
+
+    key_values = [sorted_sections_df[key].to_numpy() for key in PDF_GROUP_KEYS]
+    new_lactation = np.zeros(len(sorted_sections_df), dtype=bool)
+    new_lactation[:1] = True
+    for values in key_values:
+        new_lactation[1:] |= values[1:] != values[:-1]
+
+    starts = np.flatnonzero(new_lactation)
+    stops = np.r_[starts[1:], len(sorted_sections_df)]
+    lactations = zip(*(values[starts] for values in key_values))
+
+    section_index = {
+        lactation: slice(start, stop) for lactation, start, stop in zip(lactations, starts, stops)
+    }
+
+    return sorted_sections_df, section_index
+
+
+def calc_dim(datetimes, calving_dates):
+    """Days in lactation as float, including the time of day"""
+    return (datetimes - calving_dates).dt.total_seconds() / (60 * 60 * 24)
+
+
+def build_pdf_page_dt(cowdf, heats_df, pdf_file, threshold):
+    with PdfPageRenderer(threshold, "dt") as renderer:
+        renderer.draw_page(cowdf, heats_df, pdf_file)
+
+
+def build_pdf_page_dim(cowdf, heats_df, pdf_file, threshold):
+    with PdfPageRenderer(threshold, "dim") as renderer:
+        renderer.draw_page(cowdf, heats_df, pdf_file)
+
+
+class PdfPageRenderer:
+    """Draws the pages of one PDF on a single reused figure.
+
+    The first page is plotted with DataFrame.plot, which sets up style, axes, labels, tick formatters
+    and the threshold line. Following pages only swap the activity line data, limits, title, calving
+    marker, heat spans and legend. Creating a figure per page took most of the PDF time.
+    Use as context manager, the figure is closed on exit.
+    """
+
+    def __init__(self, threshold, x_axis_type):
+        self.threshold = threshold
+        self.x_axis_type = x_axis_type
+        self.figure = None
+        self.ax = None
+        self.activity_line = None
+        self.page_freq = None
+        self.page_artists = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.figure is not None:
+            import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+
+            plt.close(self.figure)
+            self.figure = self.ax = self.activity_line = None
+
+    def draw_page(self, cowdf, heats_df, pdf_file):
+        cownumber = cowdf["Cow Number"].iloc[0]
+        foldername = cowdf["foldername"].iloc[0]
+        lactation_no = cowdf["lactation_adj"].iloc[0]
+        title = f"{foldername} : {cownumber:.0f}_L{lactation_no:.0f}  % {heats_df['act_usable'].iloc[0]:.2f}"
+
+        if self.x_axis_type == "dim" and "DIM" not in cowdf.columns:
+            cowdf = cowdf.assign(DIM=calc_dim(cowdf["datetime"], cowdf["calving_date"].iloc[0]))
+
+        for artist in self.page_artists:
+            artist.remove()
+        self.page_artists = []
+
+        if self.ax is None or not self.set_activity_data(cowdf):
+            self.create_figure(cowdf, title)
+        else:
+            self.ax.set_title(title)
+
+        self.add_markers(cowdf, heats_df)
+
+        if self.x_axis_type == "dim":
+            # DIM axes are autoscaled, like the first page after its heat spans were added
+            self.ax.relim()
+            self.ax.autoscale_view()
+
+        self.ax.legend(loc="best")
+        self.figure.savefig(pdf_file, bbox_inches="tight", format="pdf")
+
+    def create_figure(self, cowdf, title):
+        import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+
+        self.close()
+        plt.style.use("ggplot")
+        self.figure, self.ax = plt.subplots(figsize=(14, 6))
+
+        cowdf.plot(
+            ax=self.ax,
+            kind="line",
+            x="DIM" if self.x_axis_type == "dim" else "datetime",
+            y="Activity Change",
+            title=title,
+        )
+        self.activity_line = self.ax.get_lines()[0]
+        # pandas draws regular datetimes as periods of ax.freq, other pages have to match to be redrawn
+        self.page_freq = get_page_freq(cowdf["datetime"]) if self.x_axis_type == "dt" else None
+
+        self.ax.set_ylim([-50, 110])
+
+        # Horizontal threshold line
+        self.ax.axhline(self.threshold, label=f"{self.threshold}_thresh", color="black", linestyle=":")
+
+    def set_activity_data(self, cowdf):
+        """Swaps the activity line to cowdf, returns False if the page needs a new figure"""
+        activity = cowdf["Activity Change"].to_numpy()
+
+        if self.x_axis_type == "dim":
+            self.activity_line.set_data(cowdf["DIM"].to_numpy(), activity)
+            return True
+
+        ax_freq = getattr(self.ax, "freq", None)
+        if ax_freq is None or self.page_freq is None or get_page_freq(cowdf["datetime"]) != self.page_freq:
+            return False
+        periods = pd.PeriodIndex(cowdf["datetime"], freq=ax_freq)
+        if periods[0].to_timestamp() != cowdf["datetime"].iloc[0]:
+            return False
+
+        ordinals = periods.asi8
+        self.activity_line.set_data(ordinals, activity)
+        self.ax.set_xlim(ordinals.min(), ordinals.max())
+        return True
+
+    def add_markers(self, cowdf, heats_df):
+        calving_date = cowdf["calving_date"].iloc[0]
+        heats_df = heats_df[heats_df["heat_no"] > 0].drop_duplicates("heat_no").sort_values("heat_no")
+
+        if self.x_axis_type == "dim":
+            calving_x = 0 if 0 in cowdf["Days in Lactation"].values else None
+            # Calculate DIM for start and stop of each heat
+            starts = calc_dim(heats_df["start_dt_heat"], calving_date)
+            stops = calc_dim(heats_df["stop_dt_heat"], calving_date)
+        else:
+            calving_x = calving_date + pd.Timedelta(hours=1) if cowdf["datetime"].isin([calving_date]).any() else None
+            starts, stops = heats_df["start_dt_heat"], heats_df["stop_dt_heat"]
+
+        if calving_x is not None:
+            self.page_artists.append(
+                self.ax.axvline(calving_x, label="calving", color="black", linestyle="-")
+            )
 
-        # Plot using DIM values
-        ax.axvspan(start_dim, stop_dim, alpha=0.1, color="red")
+        for start, stop in zip(starts, stops):
+            self.page_artists.append(self.ax.axvspan(start, stop, alpha=0.1, color="red"))
 
-    plt.legend(loc="best")
-    plt.savefig(pdf_file, bbox_inches="tight", format="pdf")
 
-    plt.close()
+def get_page_freq(datetimes):
+    """Inferred frequency of a page's datetimes, None if irregular"""
+    if len(datetimes) < 3:
+        return None
+    return pd.infer_freq(pd.DatetimeIndex(datetimes))
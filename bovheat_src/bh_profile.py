@@ -0,0 +1,210 @@
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+CPROFILE_FORMATS = (".prof", ".pstats")
+PROFILE_FORMATS = (".json",) + CPROFILE_FORMATS
+
+_enabled = False
+_records = []
+
+
+def enable():
+    global _enabled  # pylint: disable=global-statement
+    _enabled = True
+
+
+def is_enabled():
+    return _enabled
+
+
+def profiled(stage, count=None):
+    """Decorator, records wall time, CPU time, peak RSS and counts of every call while enabled.
+
+    Arguments:
+        stage {str} -- stage name in the summary
+        count {callable} -- optional, count(result, *args, **kwargs) returns (rows, groups)
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            start_wall, start_cpu = time.perf_counter(), time.process_time()
+            result = func(*args, **kwargs)
+            wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+
+            rows, groups = count(result, *args, **kwargs) if count else (None, None)
+            _records.append(
+                {
+                    "stage": stage,
+                    "pid": os.getpid(),
+                    "wall": wall,
+                    "cpu": cpu,
+                    "peak_rss_mb": get_peak_rss_mb(),
+                    "rows": rows,
+                    "groups": groups,
+                }
+            )
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def count_rows(result, *args, **kwargs):
+    """Counter for profiled, rows of the returned dataframe"""
+    return (None if result is None else len(result)), None
+
+
+def count_groups(keys):
+    """Returns a counter for profiled, rows and key groups of the returned dataframe"""
+
+    def count(result, *args, **kwargs):
+        if result is None:
+            return None, None
+        group_keys = [key for key in keys if key in result.columns]
+        if not group_keys:
+            return len(result), None
+        return len(result), result.groupby(group_keys, observed=True).ngroups
+
+    return count
+
+
+def get_peak_rss_mb():
+    """Returns the peak resident memory of this process in MB, None if unknown"""
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak_rss / 1024 ** (2 if os.uname().sysname == "Darwin" else 1)
+
+
+def take_records():
+    """Returns all records and removes them"""
+    records = _records[:]
+    del _records[:]
+    return records
+
+
+def add_records(records):
+    """Adds records of worker processes, see call_recorded"""
+    _records.extend(records)
+
+
+def imap_recorded(executor, func, items):
+    """Like executor.imap_unordered, records of worker processes are added to this process"""
+    if not (_enabled and executor.kind == "process"):
+        yield from executor.imap_unordered(func, items)
+        return
+
+    for result, records in executor.imap_unordered(functools.partial(call_recorded, func), items):
+        add_records(records)
+        yield result
+
+
+def call_recorded(func, item):
+    """Calls func in a worker process and returns its result with the records of this call.
+
+    Records inherited from the parent process are dropped.
+    """
+    enable()
+    take_records()
+    result = func(item)
+    return result, take_records()
+
+
+def get_summary(records):
+    """Sums up records per stage, in order of first appearance.
+
+    Wall and CPU times of calls in parallel workers add up, peak RSS is the maximum of all processes.
+    """
+    summary = {}
+    for record in records:
+        stage = summary.setdefault(
+            record["stage"],
+            {
+                "stage": record["stage"],
+                "calls": 0,
+                "wall": 0.0,
+                "cpu": 0.0,
+                "peak_rss_mb": None,
+                "rows": None,
+                "groups": None,
+            },
+        )
+        stage["calls"] += 1
+        stage["wall"] += record["wall"]
+        stage["cpu"] += record["cpu"]
+        for key in ("rows", "groups"):
+            if record[key] is not None:
+                stage[key] = (stage[key] or 0) + record[key]
+        if record["peak_rss_mb"] is not None:
+            stage["peak_rss_mb"] = max(stage["peak_rss_mb"] or 0, record["peak_rss_mb"])
+
+    return list(summary.values())
+
+
+def format_summary(summary):
+    def format_value(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    lines = [f"{'stage':<20}{'calls':>7}{'wall s':>10}{'cpu s':>10}{'peak MB':>10}{'rows':>12}{'groups':>9}"]
+    for stage in summary:
+        lines.append(
+            f"{stage['stage']:<20}{stage['calls']:>7}{stage['wall']:>10.3f}{stage['cpu']:>10.3f}"
+            + f"{format_value(stage['peak_rss_mb'], '.1f'):>10}{format_value(stage['rows'], 'd'):>12}"
+            + f"{format_value(stage['groups'], 'd'):>9}"
+        )
+    return "\n".join(lines)
+
+
+def write_json(filename, records):
+    with open(filename, "w", encoding="utf-8") as json_file:
+        json.dump({"summary": get_summary(records), "records": records}, json_file, indent=2)
+
+
+@contextlib.contextmanager
+def profile_session(filename):
+    """Profiles all stages inside the with block and prints a summary at its end.
+
+    Arguments:
+        filename {str} -- None: profiling is off, "": summary only,
+            .json: also writes records and summary, .prof/.pstats: also writes a cProfile dump
+    """
+    if filename is None:
+        yield
+        return
+
+    enable()
+    take_records()
+    profiler = cProfile.Profile() if filename.endswith(CPROFILE_FORMATS) else None
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(filename)
+
+        records = take_records()
+        print("\nProfile:")
+        print(format_summary(get_summary(records)))
+
+        if filename.endswith(".json"):
+            write_json(filename, records)
+        if filename:
+            print(f"# Profile: {filename} created.")
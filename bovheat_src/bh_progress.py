@@ -0,0 +1,101 @@
+import json
+import time
+
+PROGRESS_MODES = ("none", "bar", "json")
+
+# minimum time between two reports of a stage
+REFRESH_SECONDS = 0.25
+BAR_WIDTH = 20
+
+_mode = "bar"
+
+
+def set_mode(mode):
+    """Selects how progress is reported: none, bar (one updated console line) or json (one object per line)"""
+    global _mode  # pylint: disable=global-statement
+    if mode not in PROGRESS_MODES:
+        raise ValueError(f"unknown progress mode {mode}, choose one of {', '.join(PROGRESS_MODES)}")
+    _mode = mode
+
+
+def get_mode():
+    return _mode
+
+
+class Progress:
+    """Counts finished items of one stage and reports them at most every REFRESH_SECONDS.
+
+    Progress is reported by the main process only, workers return their results and the caller
+    counts them. Use as context manager, the final count is reported on exit.
+    """
+
+    def __init__(self, stage, total=None, unit="groups"):
+        self.stage = stage
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.mode = _mode
+        self._start = time.perf_counter()
+        self._last_report = self._start
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self, count=1):
+        self.done += count
+        now = time.perf_counter()
+        if now - self._last_report >= REFRESH_SECONDS:
+            self._last_report = now
+            self.report(now)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.report(time.perf_counter(), finished=True)
+
+    def report(self, now, finished=False):
+        if self.mode == "none":
+            return
+
+        elapsed = now - self._start
+        rate = self.done / elapsed if elapsed > 0 else None
+        eta = None
+        if self.total is not None and rate:
+            eta = max(self.total - self.done, 0) / rate
+
+        if self.mode == "json":
+            state = {
+                "stage": self.stage,
+                "done": self.done,
+                "total": self.total,
+                "unit": self.unit,
+                "elapsed": round(elapsed, 3),
+                "rate": None if rate is None else round(rate, 1),
+                "eta": None if eta is None else round(eta, 1),
+                "finished": finished,
+            }
+            print(json.dumps(state), flush=True)
+            return
+
+        line = f"\r {self.stage}"
+        if self.total:
+            filled = min(BAR_WIDTH * self.done // self.total, BAR_WIDTH)
+            line += f" [{'#' * filled}{'-' * (BAR_WIDTH - filled)}] {self.done}/{self.total} {self.unit}"
+        else:
+            line += f" {self.done} {self.unit}"
+        if rate is not None:
+            line += f", {rate:.0f}/s"
+        if finished:
+            line += f", {elapsed:.1f}s"
+        elif eta is not None:
+            line += f", ETA {format_seconds(eta)}"
+        print(line.ljust(79), end="", flush=True)
+
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes}:{seconds:02d}"
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# bump whenever stored sections, heats or pages change, invalidates all stores
+STORE_VERSION = 1
+
+LACTATION_KEYS = ["foldername", "Cow Number", "calving_date"]
+
+FINGERPRINT_COLUMNS = ["datetime", "Activity Change", "Days in Lactation", "Lactation Number"]
+
+
+def get_store_path(cache_dir, parameters):
+    """Returns the store path for one parameter set, each parameter set keeps its own store
+
+    Arguments:
+        cache_dir {str} -- folder of the store files
+        parameters {dict} -- all parameters that influence sections, heats or PDF pages
+    """
+    parameter_id = repr((STORE_VERSION, sorted(parameters.items())))
+    return os.path.join(
+        cache_dir, "results_" + hashlib.sha1(parameter_id.encode("utf-8")).hexdigest() + ".pkl"
+    )
+
+
+def load_store(store_path):
+    """Loads a result store, an unreadable or missing store is empty
+
+    Returns:
+        dict -- {(foldername, Cow Number, calving_date): entry}, entries hold fingerprint,
+        lactation_adj, sections, heats and page
+    """
+    try:
+        with open(store_path, "rb") as store_file:
+            return pickle.load(store_file)
+    except Exception:  # pylint: disable=broad-except
+        return {}
+
+
+def save_store(store_path, store):
+    # write to temporary file first, an interrupted run never leaves a partial store
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    tmp_path = f"{store_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as store_file:
+        pickle.dump(store, store_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, store_path)
+
+
+def calc_lactation_fingerprints(source_df_calved, start_dim, stop_dim):
+    """Fingerprints the rows that contribute to each lactation's time window.
+
+    A window contains all rows of the cow between start_dim and stop_dim around the calving
+    date, including rows of neighbouring lactations. The fingerprint also covers lactation_adj,
+    which is the Lactation Number of the first row with this calving date.
+
+    Returns:
+        dict -- {(foldername, Cow Number, calving_date): (row hash sum, row count, lactation_adj)}
+    """
+    cow_keys = LACTATION_KEYS[:2]
+
+    lactations_df = (
+        source_df_calved.dropna(subset=["calving_date"])
+        .groupby(LACTATION_KEYS, sort=False, observed=True)["Lactation Number"]
+        .first()
+        .rename("lactation_adj")
+        .reset_index()
+    )
+
+    rows_df = source_df_calved[cow_keys + FINGERPRINT_COLUMNS].copy()
+    rows_df["row_hash"] = pd.util.hash_pandas_object(rows_df[FINGERPRINT_COLUMNS], index=False)
+
+    window_df = rows_df.merge(lactations_df[LACTATION_KEYS], on=cow_keys)
+    in_window = (window_df["datetime"] >= window_df["calving_date"] + pd.Timedelta(days=start_dim)) & (
+        window_df["datetime"] < window_df["calving_date"] + pd.Timedelta(days=stop_dim)
+    )
+    window_df = window_df[in_window]
+
+    # sum of row hashes does not depend on row order, uint64 overflow wraps around
+    grouped = window_df.groupby(LACTATION_KEYS, sort=False, observed=True)
+    group_ids = grouped.ngroup().to_numpy()
+    hash_sums = np.zeros(grouped.ngroups, dtype=np.uint64)
+    np.add.at(hash_sums, group_ids, window_df["row_hash"].to_numpy(dtype=np.uint64))
+    row_counts = np.bincount(group_ids, minlength=grouped.ngroups)
+    window_ids = {key: group_id for group_id, key in enumerate(grouped.size().index)}
+
+    fingerprints = {}
+    for foldername, cow_number, calving_date, lactation_adj in lactations_df.itertuples(index=False):
+        key = (foldername, cow_number, calving_date)
+        window_id = window_ids.get(key)
+        if window_id is None:
+            fingerprints[key] = (0, 0, lactation_adj)
+        else:
+            fingerprints[key] = (int(hash_sums[window_id]), int(row_counts[window_id]), lactation_adj)
+
+    return fingerprints
+
+
+def split_by_lactation(result_df):
+    """Splits sections or heats into {(foldername, Cow Number, calving_date): dataframe}"""
+    return {key: lactation_df for key, lactation_df in result_df.groupby(LACTATION_KEYS, sort=False, observed=True)}
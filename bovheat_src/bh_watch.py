@@ -0,0 +1,101 @@
+import os
+
+import pandas as pd
+
+from bovheat_src import bh_input
+
+COW_KEYS = ["foldername", "Cow Number"]
+
+
+class SourceFiles:
+    """Parsed SCR files of a watched folder, kept in memory between scans.
+
+    Only new and changed files are parsed. After the first scan, a file is parsed once its size and
+    modification time are the same in two scans in a row, so files still being copied are not read.
+    """
+
+    def __init__(self, language, relative_path="", cache="off", reader="default"):
+        self.language = language
+        self.relative_path = relative_path
+        self.cache = cache
+        self.reader = reader
+        # (root, file name) -> (fingerprint, dataframe or None if unreadable)
+        self.files = {}
+        # fingerprints of changed files seen in the last scan, parsed when unchanged in the next
+        self.pending = {}
+        self.scanned = False
+
+    def scan(self, executor):
+        """Parses new and changed files and forgets removed files.
+
+        Returns:
+            set -- (foldername, Cow Number) of all cows in changed or removed files, old and new data
+        """
+        file_list = bh_input.get_file_list(
+            self.language, self.relative_path, self.cache, self.reader, verbose=not self.scanned
+        )
+        # the cache is cleared by the first scan only
+        self.cache = "on" if self.cache == "clear" else self.cache
+
+        file_args = {file_args[:2]: file_args for file_args in file_list}
+        fingerprints = {key: get_fingerprint(*key) for key in file_args}
+
+        changed_keys = []
+        for key, fingerprint in fingerprints.items():
+            if fingerprint is None or (key in self.files and self.files[key][0] == fingerprint):
+                continue
+            if not self.scanned or self.pending.get(key) == fingerprint:
+                changed_keys.append(key)
+            else:
+                self.pending[key] = fingerprint
+        removed_keys = [key for key in self.files if key not in fingerprints]
+        self.scanned = True
+
+        changed_cows = set()
+        for key in changed_keys + removed_keys:
+            changed_cows |= get_cows(self.files.pop(key, (None, None))[1])
+            self.pending.pop(key, None)
+
+        if changed_keys:
+            file_dfs = bh_input.read_file_frames([file_args[key] for key in changed_keys], executor)
+            for key, file_df in zip(changed_keys, file_dfs):
+                self.files[key] = (fingerprints[key], file_df)
+                changed_cows |= get_cows(file_df)
+
+        return changed_cows
+
+    def get_source_data(self):
+        """Merges all parsed files like bh_input.read_files"""
+        return bh_input.merge_file_frames([file_df for _, file_df in self.files.values()])
+
+
+def get_fingerprint(root, file_name):
+    """Size and modification time of a file, None if it was removed meanwhile"""
+    try:
+        return bh_input.get_file_fingerprint(root, file_name)
+    except OSError:
+        return None
+
+
+def get_cows(file_df):
+    if file_df is None:
+        return set()
+    return set(file_df[COW_KEYS].drop_duplicates().itertuples(index=False, name=None))
+
+
+def get_tmp_filename(filename):
+    """Temporary name next to filename with the same extension, moved into place with os.replace"""
+    root, extension = os.path.splitext(filename)
+    return f"{root}.{os.getpid()}.tmp{extension}"
+
+
+def update_source_frame(calved_df, changed_df, changed_cows):
+    """Replaces the rows of changed cows in calved_df by changed_df"""
+    if calved_df is None:
+        return changed_df
+
+    kept_mask = ~pd.MultiIndex.from_frame(calved_df[COW_KEYS]).isin(list(changed_cows))
+    updated_df = pd.concat([calved_df[kept_mask], changed_df], ignore_index=True)
+    updated_df["foldername"] = updated_df["foldername"].astype("category")
+
+    return updated_df
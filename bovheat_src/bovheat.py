@@ -1,17 +1,23 @@
 #!/usr/bin/env python3
 
-import itertools
+import contextlib
 import multiprocessing
+import os
 import textwrap
+import time
 import warnings
 from datetime import datetime
 
 # Hide MatplotlibDeprecationWarning in PyInstaller executable
 warnings.filterwarnings("ignore", "(?s).*MATPLOTLIBDATA.*", category=UserWarning)
 
+import numpy as np
 import pandas as pd
 
-from bovheat_src import bh_input, bh_output
+from bovheat_src import bh_executor, bh_input, bh_output, bh_profile, bh_progress, bh_store, bh_watch
+
+COW_KEYS = ["foldername", "Cow Number"]
+HEAT_GROUP_KEYS = ["foldername", "Cow Number", "lactation_adj"]
 
 
 # %%
@@ -25,200 +31,742 @@ def print_welcome():
 
 
 # %%
-def get_cleaned_copy(cowdf):
-    """Creates a cleaned and sorted copy of the cow dataframe
+@bh_profile.profiled("get_cleaned_data", count=bh_profile.count_groups(COW_KEYS))
+def get_cleaned_data(source_df, skipped_cows=None):
+    """Cleans and sorts the data of all cows at once
 
     Arguments:
-        cowdf_orginal {pd.dataframe} -- original cow dataframe
+        source_df {pd.dataframe} -- merged source data of all folders
+        skipped_cows {list} -- optional, (foldername, Cow Number) of cows skipped because their
+            Cow Number is not unique within the folder are appended
 
     Returns:
-        pd.dateframe -- cleaned cow dataframe
+        pd.dataframe -- cleaned data sorted by foldername, Cow Number and datetime
     """
+    cow_keys = ["foldername", "Cow Number"]
 
-    print(
-        "\r Cleaning data for",
-        cowdf["foldername"].iloc[0],
-        cowdf["Cow Number"].iloc[0],
-        end="".ljust(20),
-    )
-
-    cowdf = cowdf.copy()
-
-    cowdf.dropna(subset=["Lactation Number"], inplace=True)
-
-    # makes sure df is sorted
-    cowdf.sort_values(by="datetime", inplace=True)
-    cowdf.reset_index(drop=True, inplace=True)
+    cleaned_df = source_df.dropna(subset=["Lactation Number"] + cow_keys)
+    cleaned_df = cleaned_df.sort_values(by=cow_keys + ["datetime"], kind="stable")
 
     # Weekly schema creates overlapping empty 12:00am rows. Removing.
-    duplicate_mask = cowdf.duplicated("datetime", keep=False)
-    overlap_rows = cowdf[duplicate_mask & cowdf["Activity Change"].isna()]
-    cowdf.drop(overlap_rows.index, inplace=True)
+    duplicate_mask = cleaned_df.duplicated(cow_keys + ["datetime"], keep=False)
+    cleaned_df = cleaned_df[~(duplicate_mask & cleaned_df["Activity Change"].isna())]
 
     # Drop complete duplicates. Same cow information found in multiple files.
-    cowdf.drop_duplicates(inplace=True, ignore_index=True)
-    cowdf.reset_index(inplace=True, drop=True)
+    cleaned_df = cleaned_df.drop_duplicates()
 
     # If duplicates continue to remain, cow number is not unique in folder. Skipping cow.
-    remaining_duplicates = cowdf.duplicated(["datetime", "Cow Number"]).sum()
+    remaining_duplicates = cleaned_df.duplicated(cow_keys + ["datetime"])
+    skipped_df = cleaned_df.loc[remaining_duplicates, cow_keys].drop_duplicates()
+    if skipped_cows is not None:
+        skipped_cows.extend(skipped_df.itertuples(index=False, name=None))
 
-    if remaining_duplicates:
-        print(" # Cow Number is not unique within folder, skipping")
-        return pd.DataFrame()
+    skipped_mask = pd.MultiIndex.from_frame(cleaned_df[cow_keys]).isin(
+        pd.MultiIndex.from_frame(skipped_df)
+    )
 
-    return cowdf
+    return cleaned_df[~skipped_mask].reset_index(drop=True)
 
 
 # %%
-def calc_calving_date(cowdf):
-    """Tries to find calving date from days in lactation (DIM)
+@bh_profile.profiled("cut_time_window", count=bh_profile.count_groups(HEAT_GROUP_KEYS))
+def cut_time_window(source_df_calved, start_dim, stop_dim, interpolation_limit):
+    """Cuts the time window from start_dim to stop_dim around every calving date of all cows.
+
+    Each window is a 2 hour grid, observations of the cow are placed on the grid with one join.
+    Missing Activity Change values inside a window are interpolated linearly, at most
+    interpolation_limit in a row. Windows may overlap observations of neighbouring lactations.
 
     Arguments:
-        cowdf {[type]} -- [description]
+        source_df_calved {pd.DataFrame} -- cleaned data with calving_date column
+        start_dim {int} -- first day of the window relative to calving
+        stop_dim {int} -- end of the window relative to calving, excluded
+        interpolation_limit {int} -- maximum number of values filled in a row, 0: none, None: unlimited
+
+    Returns:
+        pd.DataFrame -- one row per grid point, ordered by cow, lactation and datetime
     """
-    print(
-        "\r Calculating calving date for",
-        cowdf["foldername"].iloc[0],
-        cowdf["Cow Number"].iloc[0],
-        end="".ljust(20),
+    cow_keys = ["foldername", "Cow Number"]
+
+    # lactation_adj is the Lactation Number of the first row with this calving date
+    lactations_df = (
+        source_df_calved.dropna(subset=["calving_date"])
+        .drop_duplicates(subset=cow_keys + ["calving_date"])
+        .sort_values(by=cow_keys, kind="stable")
     )
 
-    cowdf.reset_index(drop=True, inplace=True)
+    # same grid as pd.date_range(calving_date + start, calving_date + stop, freq="2h", inclusive="left")
+    origin = pd.Timestamp(0)
+    offsets = (
+        pd.date_range(
+            origin + pd.Timedelta(days=start_dim),
+            origin + pd.Timedelta(days=stop_dim),
+            freq="2h",
+            inclusive="left",
+        )
+        - origin
+    ).to_numpy()
+    window_length = len(offsets)
+
+    lactation_rows = np.repeat(np.arange(len(lactations_df)), window_length)
+    window_df = lactations_df[cow_keys].iloc[lactation_rows].reset_index(drop=True)
+    calving_dates = lactations_df["calving_date"].to_numpy()[lactation_rows]
+    window_df["datetime"] = calving_dates + np.tile(offsets, len(lactations_df))
+
+    value_columns = ["Activity Change", "Lactation Number", "Days in Lactation"]
+    sections_df = window_df.merge(
+        source_df_calved[cow_keys + ["datetime"] + value_columns],
+        on=cow_keys + ["datetime"],
+        how="left",
+        sort=False,
+        validate="many_to_one",
+    )
 
-    if cowdf["Days in Lactation"].min() >= 0:
-        min_dim_row = cowdf.loc[cowdf["Days in Lactation"].idxmin()]
-        min_dim_value = min_dim_row["Days in Lactation"]
-        min_dim_date = min_dim_row["datetime"]
+    # interpolates, especially over 10:00pm missing values
+    # interpolated values are calculated in float64, heat detection must not depend on source dtype
+    sections_df["Activity Change"] = interpolate_windows(
+        sections_df["Activity Change"].to_numpy(dtype=float, na_value=np.nan),
+        window_length,
+        interpolation_limit,
+    )
+    sections_df["calving_date"] = calving_dates
+    sections_df["lactation_adj"] = (
+        lactations_df["Lactation Number"].to_numpy(dtype=float, na_value=np.nan)[lactation_rows]
+    )
 
-        calving_datetime = min_dim_date - pd.Timedelta(days=min_dim_value)
-        return calving_datetime.normalize()
+    return sections_df
+
+
+def interpolate_windows(values, window_length, interpolation_limit):
+    """Interpolates missing values between valid values of the same window.
+
+    Equals Series.interpolate(limit_area="inside", limit=interpolation_limit) per window of
+    window_length consecutive values, a limit of 0 fills nothing.
+    """
+    positions = np.arange(len(values))
+    valid = ~np.isnan(values)
+    if interpolation_limit == 0 or valid.sum() < 2:
+        return values
+
+    window_starts = positions - positions % window_length if window_length else positions
+    previous_valid = np.maximum.accumulate(np.where(valid, positions, -1))
+    next_valid = np.minimum.accumulate(np.where(valid, positions, len(values))[::-1])[::-1]
+
+    fill = (
+        ~valid
+        & (previous_valid >= window_starts)
+        & (next_valid < window_starts + window_length)
+    )
+    if interpolation_limit is not None:
+        fill &= positions - previous_valid <= interpolation_limit
 
-    return None
+    values = values.copy()
+    values[fill] = np.interp(positions[fill], positions[valid], values[valid])
+    return values
 
 
 # %%
-def cut_time_window(cowdf, start_dim, stop_dim, interpolation_limit):
-    print(
-        "\r Selecting time window for",
-        cowdf["foldername"].iloc[0],
-        cowdf["Cow Number"].iloc[0],
-        end="".ljust(20),
+HEAT_COLUMNS = [
+    "calving_date",
+    "act_usable",
+    "act_max",
+    "heat_count",
+    "heat_no",
+    "start_dt_heat",
+    "stop_dt_heat",
+    "duration_heat",
+    "max_act_heat",
+    "max_dim_heat",
+    "max_dt_heat",
+    "short_inter_estrus",
+]
+
+
+def calc_heats(cowdf, threshold, minheatlength):
+    """Calculates heats of a single lactation, see calc_all_heats"""
+    return calc_all_heats(cowdf, threshold, minheatlength, group_keys=[])
+
+
+@bh_profile.profiled("calc_heats", count=bh_profile.count_groups(HEAT_GROUP_KEYS))
+def calc_all_heats(sections_df, threshold, minheatlength, group_keys=None):
+    """Detects heats for all lactations at once.
+
+    A heat is a run of consecutive observations with Activity Change >= threshold within one
+    lactation, at least minheatlength observations long. Runs are found by run-length encoding
+    the threshold mask over all lactations, row order within a lactation is kept.
+
+    Arguments:
+        sections_df {pd.DataFrame} -- time windows of all lactations
+        threshold {int} -- heat detection threshold
+        minheatlength {int} -- minimum number of observations per heat
+
+    Keyword Arguments:
+        group_keys {list} -- columns identifying a lactation (default: HEAT_GROUP_KEYS)
+
+    Returns:
+        pd.DataFrame -- one row per heat, one empty row for lactations without heats
+    """
+    return detect_heats(get_heat_arrays(sections_df, group_keys), threshold, minheatlength)
+
+
+def get_heat_arrays(sections_df, group_keys=None):
+    """Sorts sections by lactation and extracts the arrays needed by detect_heats.
+
+    Independent of threshold and minheatlength, can be reused for several detection passes.
+    """
+    if group_keys is None:
+        group_keys = HEAT_GROUP_KEYS
+
+    if group_keys:
+        group_ids = sections_df.groupby(group_keys, sort=True, observed=True).ngroup().to_numpy()
+        # rows with missing keys are dropped, like in groupby
+        valid_rows = np.flatnonzero(group_ids >= 0)
+        row_order = valid_rows[np.argsort(group_ids[valid_rows], kind="stable")]
+        group_ids = group_ids[row_order]
+        sections_df = sections_df.iloc[row_order]
+    else:
+        group_ids = np.zeros(len(sections_df), dtype=np.int64)
+
+    new_group = np.ones(len(group_ids), dtype=bool)
+    new_group[1:] = group_ids[1:] != group_ids[:-1]
+    group_starts = np.flatnonzero(new_group)
+
+    return {
+        "group_keys": list(group_keys),
+        "group_ids": group_ids,
+        "new_group": new_group,
+        "group_starts": group_starts,
+        "group_rows_df": sections_df.iloc[group_starts][list(group_keys) + ["calving_date"]],
+        "activity": sections_df["Activity Change"].to_numpy(dtype=float, na_value=np.nan),
+        "datetime": sections_df["datetime"].to_numpy(),
+        "dim": sections_df["Days in Lactation"].to_numpy(dtype=float, na_value=np.nan),
+    }
+
+
+def detect_heats(heat_arrays, threshold, minheatlength):
+    """Detects heats in arrays prepared by get_heat_arrays, see calc_all_heats"""
+    MINIMUM_HOURS_APART = 10
+
+    group_ids = heat_arrays["group_ids"]
+    new_group = heat_arrays["new_group"]
+    group_starts = heat_arrays["group_starts"]
+    activity = heat_arrays["activity"]
+    row_count = len(activity)
+    group_count = len(group_starts)
+    group_sizes = np.diff(np.r_[group_starts, row_count])
+
+    # run-length encoding of observations above threshold, runs never cross lactations
+    above = activity >= threshold
+    run_start_mask = above & (new_group | ~np.r_[False, above[:-1]])
+    run_stop_mask = above & (np.r_[new_group[1:], True] | ~np.r_[above[1:], False])
+    run_starts = np.flatnonzero(run_start_mask)
+    run_stops = np.flatnonzero(run_stop_mask)
+
+    keep = run_stops - run_starts + 1 >= minheatlength
+    run_starts, run_stops = run_starts[keep], run_stops[keep]
+    run_lengths = run_stops - run_starts + 1
+    run_count = len(run_starts)
+    run_groups = group_ids[run_starts]
+
+    # maximum activity per run and its first row, equals idxmax
+    run_offsets = np.r_[0, np.cumsum(run_lengths)[:-1]].astype(np.int64)
+    run_of_row = np.repeat(np.arange(run_count), run_lengths)
+    run_rows = run_starts[run_of_row] + np.arange(len(run_of_row)) - run_offsets[run_of_row]
+    run_activity = activity[run_rows]
+    run_max = np.maximum.reduceat(run_activity, run_offsets) if run_count else np.empty(0)
+    max_positions = np.flatnonzero(run_activity == run_max[run_of_row])
+    _, first_max = np.unique(run_of_row[max_positions], return_index=True)
+    run_argmax = run_rows[max_positions[first_max]]
+
+    # heats are numbered per lactation, previous heat of the same lactation sets interval
+    heat_counts = np.bincount(run_groups, minlength=group_count)
+    first_heat = np.r_[0, np.cumsum(heat_counts)[:-1]]
+    heat_no = np.arange(run_count) - first_heat[run_groups] + 1
+    short_inter_estrus = np.full(run_count, np.nan)
+    gap_hours = (run_starts[1:] - run_stops[:-1]) * 2
+    short_inter_estrus[1:][(heat_no[1:] > 1) & (gap_hours < MINIMUM_HOURS_APART)] = 1
+
+    act_max = np.full(group_count, np.nan)
+    np.fmax.at(act_max, run_groups, run_max)
+    act_usable = (
+        np.add.reduceat(~np.isnan(activity), group_starts) / group_sizes * 100
+        if group_count
+        else np.empty(0)
     )
 
-    timeframe_dfs = pd.DataFrame()
+    # lactations without heats keep one empty row
+    rows_per_group = np.maximum(heat_counts, 1)
+    out_groups = np.repeat(np.arange(group_count), rows_per_group)
+    out_heats = np.full(len(out_groups), -1)
+    heat_rows = np.r_[0, np.cumsum(rows_per_group)[:-1]][run_groups] + heat_no - 1
+    out_heats[heat_rows] = np.arange(run_count)
+    has_heat = out_heats >= 0
+    heat_index = out_heats[has_heat]
+
+    def scatter(values, fill):
+        column = np.full(len(out_groups), fill, dtype=np.asarray(values).dtype)
+        column[has_heat] = values[heat_index]
+        return column
+
+    datetimes = heat_arrays["datetime"]
+    dims = heat_arrays["dim"]
+
+    heat_df = heat_arrays["group_rows_df"].iloc[out_groups].reset_index(drop=True)
+    heat_df["act_usable"] = act_usable[out_groups]
+    heat_df["act_max"] = act_max[out_groups]
+    heat_df["heat_count"] = heat_counts[out_groups]
+    # integer heat labels, lactations without heats have none
+    heat_df["heat_no"] = pd.arrays.IntegerArray(scatter(heat_no.astype(np.int64), 0), ~has_heat)
+    heat_df["start_dt_heat"] = scatter(datetimes[run_starts], np.datetime64("NaT"))
+    heat_df["stop_dt_heat"] = scatter(datetimes[run_stops], np.datetime64("NaT"))
+    heat_df["duration_heat"] = scatter(run_lengths * 2.0, np.nan)
+    heat_df["max_act_heat"] = scatter(run_max, np.nan)
+    heat_df["max_dim_heat"] = scatter(dims[run_argmax], np.nan)
+    heat_df["max_dt_heat"] = scatter(datetimes[run_argmax], np.datetime64("NaT"))
+    heat_df["short_inter_estrus"] = scatter(short_inter_estrus, np.nan)
+
+    return heat_df[heat_arrays["group_keys"] + HEAT_COLUMNS]
+
+
+@bh_profile.profiled("calc_heats", count=bh_profile.count_groups(["threshold", "minheatlength"] + HEAT_GROUP_KEYS))
+def calc_heat_sweep(sections_df, thresholds, minheatlengths):
+    """Detects heats for every combination of threshold and minheatlength.
+
+    Sections are sorted and converted to arrays once, every combination is one detection pass.
+
+    Returns:
+        pd.DataFrame -- long heat table of all combinations with threshold and minheatlength columns
+    """
+    heat_arrays = get_heat_arrays(sections_df)
+
+    sweep_dfs = []
+    for threshold in thresholds:
+        for minheatlength in minheatlengths:
+            heat_df = detect_heats(heat_arrays, threshold, minheatlength)
+            heat_df.insert(0, "minheatlength", minheatlength)
+            heat_df.insert(0, "threshold", threshold)
+            sweep_dfs.append(heat_df)
 
-    calving_dates = [date for date in cowdf["calving_date"].unique() if not pd.isnull(date)]
-    for calving_date in calving_dates:
-        type(calving_date)
-        date_start = calving_date + pd.Timedelta(days=start_dim)
-        date_end = calving_date + pd.Timedelta(days=stop_dim)
+    return pd.concat(sweep_dfs, ignore_index=True)
 
-        datetime_range = pd.date_range(date_start, date_end, freq="2H", inclusive="left")
-        base_df = pd.DataFrame(data={"datetime": datetime_range})
 
-        timeframe_df = pd.merge(base_df, cowdf, on="datetime", how="left", validate="one_to_one")
+# %%
+def get_calved_data(source_df, executor=None):
+    """Cleans source data and adds the calving_date of each lactation
+
+    Arguments:
+        source_df {pd.dataframe} -- merged source data, see bh_input.get_source_data
+        executor {bh_executor.Executor} -- optional, cows are processed in parallel shards
 
-        # interpolates, especially over 10:00pm missing values
-        timeframe_df["Activity Change"] = timeframe_df["Activity Change"].interpolate(
-            limit_area="inside", limit=interpolation_limit
+    Returns:
+        pd.dataframe -- cleaned data with calving_date and calving_date_inconsistent columns
+    """
+    skipped_cows = []
+    with get_shard_progress("Cleaning data", executor) as progress:
+        calved_df = calc_calved_data(source_df, executor, progress, skipped_cows)
+
+    for foldername, cow_number in skipped_cows:
+        print(
+            "\r Cleaning data for",
+            foldername,
+            cow_number,
+            "# Cow Number is not unique within folder, skipping",
         )
-        timeframe_df["lactation_adj"] = cowdf[cowdf["calving_date"] == calving_date][
-            "Lactation Number"
-        ].iloc[0]
-        timeframe_df["calving_date"] = calving_date
 
-        # columns can remain empty, dropping them insures the use of the index from outer groupby
-        # apply
-        timeframe_df.drop(columns=["Cow Number", "foldername"], inplace=True)
-        timeframe_dfs = pd.concat([timeframe_dfs, timeframe_df], axis=0, sort=False)
+    inconsistent_count = (
+        calved_df.loc[calved_df["calving_date_inconsistent"], COW_KEYS + ["Lactation Number"]]
+        .drop_duplicates()
+        .shape[0]
+    )
+    if inconsistent_count:
+        print(
+            f"\r {inconsistent_count} lactation(s) with Days in Lactation implying different calving dates,"
+            + " the lowest DIM is used. See calving_date_inconsistent in --export_intermediate."
+        )
 
-    return timeframe_dfs
+    return calved_df
 
 
-# %%
-def calc_heats(cowdf, threshold, minheatlength):
-    MINIMUM_HOURS_APART = 10
+def calc_calved_data(source_df, executor=None, progress=None, skipped_cows=None):
+    """Like get_calved_data without console output, finished cows are counted in progress.
+
+    Cows skipped by get_cleaned_data are appended to skipped_cows, if given.
+    """
+    if executor is None:
+        return add_calving_dates(get_cleaned_data(source_df, skipped_cows))
+
+    shard_results = bh_executor.map_shards(executor, calc_calved_shard, source_df, COW_KEYS, progress=progress)
+    if skipped_cows is not None:
+        for _, shard_skipped_cows in shard_results:
+            skipped_cows.extend(shard_skipped_cows)
+
+    calved_df = concat_shards([shard_df for shard_df, _ in shard_results])
+    # shards without any calving date have no datetime dtype
+    calved_df["calving_date"] = pd.to_datetime(calved_df["calving_date"])
+    return calved_df
 
-    print(
-        "\r Calculating heats for",
-        cowdf["foldername"].iloc[0],
-        cowdf["Cow Number"].iloc[0],
-        end="".ljust(20),
+
+def calc_calved_shard(source_df):
+    """Cleans one shard of calc_calved_data, returns (calved data, skipped cows)"""
+    skipped_cows = []
+    return add_calving_dates(get_cleaned_data(source_df, skipped_cows)), skipped_cows
+
+
+def get_shard_progress(stage, executor, show_progress=True):
+    """Progress of a stage processed in shards, no progress without executor"""
+    if executor is None or not show_progress:
+        return contextlib.nullcontext()
+    return bh_progress.Progress(stage, unit="cows")
+
+
+@bh_profile.profiled("calc_calving_date", count=bh_profile.count_groups(COW_KEYS + ["Lactation Number"]))
+def add_calving_dates(source_df_cleaned):
+    """Adds the calving_date of each lactation to cleaned data, see get_cleaned_data
+
+    The first row with the lowest Days in Lactation of a lactation implies its calving date,
+    lactations with negative or missing DIM get NaT.
+    calving_date_inconsistent marks lactations whose rows imply different calving dates.
+    """
+    if source_df_cleaned.empty:
+        return source_df_cleaned.assign(calving_date=pd.NaT, calving_date_inconsistent=False)
+
+    group_ids = (
+        source_df_cleaned.groupby(COW_KEYS + ["Lactation Number"], sort=False, observed=True)
+        .ngroup()
+        .to_numpy()
+    )
+    group_count = group_ids.max() + 1
+    dims = pd.Series(
+        source_df_cleaned["Days in Lactation"].to_numpy(dtype=float, na_value=np.nan),
+        index=source_df_cleaned.index,
     )
+    # missing DIM is filled before the conversion, NaN overflows in to_timedelta
+    implied_dates = (
+        (source_df_cleaned["datetime"] - pd.to_timedelta(dims.fillna(0), unit="D"))
+        .dt.normalize()
+        .mask(dims.isna())
+        .to_numpy()
+    )
+
+    # first row with the lowest DIM of every lactation, equals idxmin
+    min_dims = dims.groupby(group_ids).transform("min").to_numpy()
+    min_rows = np.flatnonzero((dims.to_numpy() == min_dims) & (group_ids >= 0) & (min_dims >= 0))
+    _, first_min = np.unique(group_ids[min_rows], return_index=True)
+    min_rows = min_rows[first_min]
+
+    calving_dates = np.full(group_count + 1, np.datetime64("NaT"), dtype=implied_dates.dtype)
+    calving_dates[group_ids[min_rows]] = implied_dates[min_rows]
+
+    # rows with missing keys are in group -1, the last entry stays NaT and False
+    valid_rows = np.flatnonzero((dims.to_numpy() >= 0) & (group_ids >= 0))
+    implied_df = pd.DataFrame({"group": group_ids[valid_rows], "date": implied_dates[valid_rows]})
+    date_counts = np.bincount(implied_df.drop_duplicates()["group"], minlength=group_count + 1)
+
+    return source_df_cleaned.assign(
+        calving_date=calving_dates[group_ids],
+        calving_date_inconsistent=(date_counts > 1)[group_ids],
+    ).reset_index(drop=True)
 
-    act_usable = cowdf["Activity Change"].count() / (len(cowdf)) * 100
-    cowdf.reset_index(drop=True, inplace=True)
-
-    heat_df = pd.DataFrame(
-        columns=[
-            "calving_date",
-            "act_usable",
-            "act_max",
-            "heat_count",
-            "heat_no",
-            "start_dt_heat",
-            "stop_dt_heat",
-            "duration_heat",
-            "max_act_heat",
-            "max_dim_heat",
-            "max_dt_heat",
-            "short_inter_estrus",
+
+def calc_results(source_df_calved, start_parameters, interpolation_limit, executor=None, show_progress=True):
+    """Cuts time windows and detects heats for every threshold and minheatlength.
+
+    With an executor, cows are processed in parallel shards. Results are identical.
+    Progress of the shards is shown unless show_progress is False.
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame) -- sections, heats of lactations with usable activity data
+    """
+    if executor is None:
+        sections_df, heats_df = calc_sections_and_heats(source_df_calved, start_parameters, interpolation_limit)
+    else:
+        with get_shard_progress("Calculating heats", executor, show_progress) as progress:
+            shard_results = bh_executor.map_shards(
+                executor,
+                calc_sections_and_heats,
+                source_df_calved,
+                COW_KEYS,
+                start_parameters,
+                interpolation_limit,
+                progress=progress,
+            )
+        sections_df = concat_shards([sections_df for sections_df, _ in shard_results])
+        heats_df = concat_shards([heats_df for _, heats_df in shard_results])
+        if is_sweep(start_parameters):
+            # every shard holds all combinations, restore the order of calc_heat_sweep
+            heats_df = heats_df.sort_values(["threshold", "minheatlength"], kind="stable", ignore_index=True)
+
+    return sections_df, heats_df[heats_df["act_usable"] > 0]
+
+
+def calc_sections_and_heats(source_df_calved, start_parameters, interpolation_limit):
+    """Cuts time windows and detects heats, heats include lactations without usable activity data"""
+    sections_df = cut_time_window(
+        source_df_calved,
+        start_parameters["start_dim"],
+        start_parameters["stop_dim"],
+        interpolation_limit,
+    )
+
+    thresholds = start_parameters["threshold"]
+    minheatlengths = start_parameters["minheatlength"]
+
+    if is_sweep(start_parameters):
+        heats_df = calc_heat_sweep(sections_df, thresholds, minheatlengths)
+    else:
+        heats_df = calc_all_heats(sections_df, thresholds[0], minheatlengths[0])
+
+    return sections_df, heats_df
+
+
+def concat_shards(shard_dfs):
+    """Concatenates results of bh_executor.map_shards, empty shards are dropped to keep dtypes"""
+    non_empty_dfs = [shard_df for shard_df in shard_dfs if not shard_df.empty]
+    return pd.concat(non_empty_dfs or shard_dfs[:1], ignore_index=True)
+
+
+def analyze(
+    source,
+    start_dim,
+    stop_dim,
+    threshold=35,
+    minheatlength=1,
+    interpolation_limit=2,
+    executor=None,
+    show_progress=False,
+):
+    """Detects heats in source data in memory, without console input or output and without files.
+
+    Arguments:
+        source {pd.DataFrame or dict} -- source data as returned by bh_input.get_source_data or a dict
+            of column arrays, see bh_input.get_source_frame. Data with a calving_date column, e.g.
+            from bh_input.read_intermediate, is used as cleaned data.
+        start_dim {int} -- first day of the observation period, negative values are allowed
+        stop_dim {int} -- last day of the observation period
+        threshold {int or list} -- threshold for heat detection, several values start a sweep
+        minheatlength {int or list} -- minimum number of heat observations, several values start a sweep
+        interpolation_limit {int} -- maximum number of consecutive missing values to fill, 0 disables
+            interpolation, None fills every gap inside the observation period
+        executor {bh_executor.Executor} -- optional, cows are processed in parallel shards
+        show_progress {bool} -- show progress of parallel shards, see bh_progress
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame) -- sections, heats of lactations with usable activity data
+    """
+    if start_dim > stop_dim:
+        raise ValueError("start_dim has to be lower or equal stop_dim")
+
+    start_parameters = {
+        "start_dim": start_dim,
+        "stop_dim": stop_dim,
+        "threshold": np.atleast_1d(threshold).tolist(),
+        "minheatlength": np.atleast_1d(minheatlength).tolist(),
+    }
+
+    source_df = bh_input.get_source_frame(source)
+    if "calving_date" not in source_df.columns:
+        with get_shard_progress("Cleaning data", executor, show_progress) as progress:
+            source_df = calc_calved_data(source_df, executor, progress)
+
+    return calc_results(source_df, start_parameters, interpolation_limit, executor, show_progress)
+
+
+def calc_results_incremental(source_df_calved, start_parameters, interpolation_limit, store, executor=None):
+    """Like calc_results, but recalculates only cows with changed lactations.
+
+    Lactations whose window fingerprint matches the store are taken from the store, the store
+    is updated in place. Lactations that no longer exist are removed from the store.
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame) -- sections, heats of lactations with usable activity data
+    """
+    fingerprints = bh_store.calc_lactation_fingerprints(
+        source_df_calved, start_parameters["start_dim"], start_parameters["stop_dim"]
+    )
+
+    for key in list(store):
+        if key not in fingerprints:
+            del store[key]
+
+    changed_cows = {
+        key[:2]
+        for key, fingerprint in fingerprints.items()
+        if key not in store or store[key]["fingerprint"] != fingerprint
+    }
+    changed_keys = [key for key in fingerprints if key[:2] in changed_cows]
+    print(f"\r {len(changed_keys)} of {len(fingerprints)} lactations changed, recalculating")
+
+    if changed_cows:
+        cow_keys = ["foldername", "Cow Number"]
+        changed_mask = pd.MultiIndex.from_frame(source_df_calved[cow_keys]).isin(list(changed_cows))
+        sections_df, heats_df = calc_results(
+            source_df_calved[changed_mask], start_parameters, interpolation_limit, executor
+        )
+        lactation_sections = bh_store.split_by_lactation(sections_df)
+        lactation_heats = bh_store.split_by_lactation(heats_df)
+
+        for key in changed_keys:
+            store[key] = {
+                "fingerprint": fingerprints[key],
+                "sections": lactation_sections.get(key, sections_df.iloc[:0]),
+                "heats": lactation_heats.get(key, heats_df.iloc[:0]),
+                "page": None,
+            }
+
+    if not store:
+        raise Exception("No lactations found.")
+
+    sort_keys = [key for key in ["threshold", "minheatlength"] if is_sweep(start_parameters)]
+    sections_df = pd.concat([entry["sections"] for entry in store.values()], ignore_index=True)
+    heats_df = pd.concat([entry["heats"] for entry in store.values()], ignore_index=True)
+    heats_df = heats_df.sort_values(sort_keys + HEAT_GROUP_KEYS, kind="stable", ignore_index=True)
+
+    return sections_df, heats_df
+
+
+def write_pdf_incremental(store, heats_df, sections_df, threshold, filename, x_axis_type):
+    """Writes the PDF from stored pages, only pages of recalculated lactations are drawn"""
+    lactation_keys = heats_df.groupby(HEAT_GROUP_KEYS, observed=True)["calving_date"].first()
+    store_keys = {
+        lactation: lactation[:2] + (calving_date,) for lactation, calving_date in lactation_keys.items()
+    }
+
+    missing_mask = [store[store_keys[lactation]]["page"] is None for lactation in lactation_keys.index]
+    missing_lactations = lactation_keys.index[missing_mask]
+    print(f"Drawing {len(missing_lactations)} of {len(lactation_keys)} PDF pages ...")
+
+    if len(missing_lactations):
+        missing_heats_df = heats_df[
+            pd.MultiIndex.from_frame(heats_df[HEAT_GROUP_KEYS]).isin(missing_lactations)
         ]
+        with bh_progress.Progress("Drawing PDF pages", len(missing_lactations), "pages") as progress:
+            pages = bh_output.render_pdf_pages(missing_heats_df, sections_df, threshold, x_axis_type, progress)
+        for lactation, page in pages.items():
+            store[store_keys[lactation]]["page"] = page
+
+    bh_output.write_pdf_from_pages(
+        [store[store_keys[lactation]]["page"] for lactation in lactation_keys.index],
+        filename + ".pdf",
     )
 
-    heat_df.loc[len(heat_df)] = pd.Series(dtype=object)
 
-    peak_groups = []  # Example: [[2, 3, 4, 5], [8, 9, 10, 11]]
-    gte_threshold_indexes = cowdf[cowdf["Activity Change"] >= threshold].index
+def analyze_with_args(source_df_calved, args, start_parameters, executor):
+    """Runs analyze with the command-line parameters, progress is shown"""
+    return analyze(
+        source_df_calved,
+        start_parameters["start_dim"],
+        start_parameters["stop_dim"],
+        threshold=start_parameters["threshold"],
+        minheatlength=start_parameters["minheatlength"],
+        interpolation_limit=args.interpolation_limit,
+        executor=executor,
+        show_progress=True,
+    )
+
+
+def run_streaming(args, start_parameters, out_filename, executor):
+    """Reads and processes one folder at a time.
+
+    Sections of a folder are written to the PDF and released before the next folder is read,
+    only the heats of all folders are kept for the XLSX file.
+    """
+    try:
+        print("Reading source")
+        file_list = bh_input.get_file_list(
+            start_parameters["language"], relative_path=args.relative_path, cache=args.cache, reader=args.reader
+        )
+    except Exception as exception:
+        print("Error:", exception)
+        input("Press Enter to exit.")
+        raise SystemExit
 
-    for _, group in itertools.groupby(enumerate(gte_threshold_indexes), lambda x: x[1] - x[0]):
-        peak_groups.append(list(map(lambda x: x[1], group)))
+    pdf_file = None
+    if not (is_sweep(start_parameters) or args.no_pdf):
+        pdf_file = bh_output.open_pdf(out_filename + ".pdf")
+
+    heats_dfs = []
+    for foldername, folder_file_list in bh_input.get_folder_file_lists(file_list):
+        print(f"\nProcessing folder {foldername} ...")
+        try:
+            source_df = bh_input.read_files(folder_file_list, executor=executor)
+        except Exception as exception:
+            print(f"\r{foldername} ...SKIPPED:", exception)
+            continue
+
+        source_df_calved = get_calved_data(source_df, executor)
+        del source_df
+
+        if source_df_calved["calving_date"].isna().all():
+            print(f"\r{foldername} ...SKIPPED: no calving dates found")
+            continue
+
+        sections_df, heats_filtered_df = analyze_with_args(source_df_calved, args, start_parameters, executor)
+        heats_dfs.append(heats_filtered_df)
+
+        if pdf_file is not None:
+            page_count = heats_filtered_df.groupby(HEAT_GROUP_KEYS, observed=True).ngroups
+            with bh_progress.Progress("Writing PDF", page_count, "pages") as progress:
+                bh_output.add_pdf_pages(
+                    pdf_file,
+                    heats_filtered_df,
+                    sections_df,
+                    threshold=start_parameters["threshold"][0],
+                    x_axis_type=args.x_axis_type,
+                    progress=progress,
+                )
+
+    if pdf_file is not None:
+        pdf_file.close()
+
+    if not heats_dfs:
+        print("Error: No files found or readable.")
+        input("Press Enter to exit.")
+        raise SystemExit
 
-    peak_groups = [group for group in peak_groups if len(group) >= minheatlength]
+    heats_df = pd.concat(heats_dfs, ignore_index=True)
+    if not args.no_xlsx:
+        print("\nCalculation finished - Writing xlsx file...")
+        bh_output.write_xlsx(heats_df, filename=out_filename)
 
-    for index, heat_group in enumerate(peak_groups):
-        heat_no = index + 1
-        start_dt_heat = cowdf.loc[heat_group[0]]["datetime"]
-        stop_dt_heat = cowdf.loc[heat_group[-1]]["datetime"]
-        duration_heat = len(heat_group) * 2
-        max_act_heat = cowdf.loc[heat_group]["Activity Change"].max()
-        maxid = cowdf.loc[heat_group]["Activity Change"].idxmax()
-        max_dim_heat = cowdf.loc[maxid]["Days in Lactation"]
-        max_dt_heat = cowdf.loc[maxid]["datetime"]
+    if args.export_results:
+        bh_output.write_results(heats_df, args.export_results)
 
-        heat_df.loc[index, "heat_no"] = heat_no
-        heat_df.loc[index, "start_dt_heat"] = start_dt_heat
-        heat_df.loc[index, "stop_dt_heat"] = stop_dt_heat
-        heat_df.loc[index, "duration_heat"] = duration_heat
-        heat_df.loc[index, "max_act_heat"] = max_act_heat
-        heat_df.loc[index, "max_dim_heat"] = max_dim_heat
-        heat_df.loc[index, "max_dt_heat"] = max_dt_heat
+    if args.no_pdf:
+        print("\nPDF is not written, --no-pdf is set.")
+    elif pdf_file is None:
+        print("\nPDF is not written for threshold or minheatlength sweeps.")
+    else:
+        print(f"\n# PDF: {out_filename}.pdf created.")
 
-        if index > 0:
-            if (heat_group[0] - peak_groups[index - 1][-1]) * 2 < MINIMUM_HOURS_APART:
-                heat_df.loc[index, "short_inter_estrus"] = 1
 
-    heat_df["calving_date"] = cowdf["calving_date"].iloc[0]
-    heat_df["heat_count"] = heat_df["heat_no"].nunique()
-    heat_df["act_usable"] = act_usable
-    heat_df["act_max"] = heat_df["max_act_heat"].max()
+def is_sweep(start_parameters):
+    return len(start_parameters["threshold"]) > 1 or len(start_parameters["minheatlength"]) > 1
 
-    return heat_df
 
+def format_values(values):
+    """Formats parameter values for filenames, 35 or 25-50 for sweeps"""
+    if len(values) == 1:
+        return f"{values[0]}"
+    return f"{values[0]}-{values[-1]}"
 
-# %%
-def main():
-    print_welcome()
-    args = bh_input.get_args()
-    start_parameters = bh_input.get_start_parameters(args)
 
+def run_analysis(args, start_parameters, out_filename, executor):
+    """Reads all data at once, then calculates and writes the results"""
     # Scan all file root and subfolders for xls and xslx files.
     # Raise exception and exit if none are found.
     try:
         print("Reading source")
-        source_df = bh_input.get_source_data(
-            start_parameters["language"], core_count=args.cores, relative_path=args.relative_path,
-        )
+        if args.intermediate:
+            source_df_calved = bh_input.read_intermediate(args.intermediate)
+        else:
+            source_df = bh_input.get_source_data(
+                start_parameters["language"],
+                core_count=args.cores,
+                relative_path=args.relative_path,
+                cache=args.cache,
+                reader=args.reader,
+                executor=executor,
+            )
     except Exception as exception:
         print("Error:", exception)
         input("Press Enter to exit.")
@@ -226,57 +774,191 @@ def main():
 
     print("\nProcessing ...")
 
-    source_df_cleaned = source_df.groupby(["foldername", "Cow Number"], group_keys=False).apply(
-        get_cleaned_copy
-    )
+    if not args.intermediate:
+        source_df_calved = get_calved_data(source_df, executor)
 
-    calving_dates = source_df_cleaned.groupby(
-        ["foldername", "Cow Number", "Lactation Number"]
-    ).apply(calc_calving_date)
+        if args.export_intermediate:
+            bh_output.write_intermediate(source_df_calved, args.export_intermediate)
 
-    source_df_calved = pd.merge(
-        source_df_cleaned,
-        calving_dates.rename("calving_date"),
-        on=calving_dates.index.names,
-        how="left",
+    if args.incremental:
+        store_path = get_store_path(args, start_parameters)
+        store = bh_store.load_store(store_path)
+        sections_df, heats_filtered_df = calc_results_incremental(
+            source_df_calved, start_parameters, args.interpolation_limit, store, executor
+        )
+    else:
+        sections_df, heats_filtered_df = analyze_with_args(source_df_calved, args, start_parameters, executor)
+
+    if not args.no_xlsx:
+        print("\nCalculation finished - Writing xlsx file...")
+        bh_output.write_xlsx(heats_filtered_df, filename=out_filename)
+
+    if args.export_results:
+        bh_output.write_results(heats_filtered_df, args.export_results)
+
+    if args.no_pdf:
+        print("\nPDF is not written, --no-pdf is set.")
+    elif is_sweep(start_parameters):
+        print("\nPDF is not written for threshold or minheatlength sweeps.")
+    elif args.incremental and bh_output.can_merge_pdf():
+        print("\nWriting PDF file...")
+        write_pdf_incremental(
+            store,
+            heats_filtered_df,
+            sections_df,
+            threshold=start_parameters["threshold"][0],
+            filename=out_filename,
+            x_axis_type=args.x_axis_type,
+        )
+    else:
+        print("\nWriting PDF file... you can cancel this step at any time.")
+        bh_output.write_pdf(
+            heats_filtered_df,
+            sections_df=sections_df,
+            threshold=start_parameters["threshold"][0],
+            filename=out_filename,
+            x_axis_type=args.x_axis_type,
+            executor=executor,
+        )
+
+    if args.incremental:
+        bh_store.save_store(store_path, store)
+
+
+def get_store_path(args, start_parameters):
+    """Store of --incremental in the cache folder of the data, one store per parameter set"""
+    return bh_store.get_store_path(
+        os.path.join(os.getcwd(), args.relative_path, bh_input.CACHE_DIRNAME),
+        {
+            "start_dim": start_parameters["start_dim"],
+            "stop_dim": start_parameters["stop_dim"],
+            "interpolation_limit": args.interpolation_limit,
+            "threshold": start_parameters["threshold"],
+            "minheatlength": start_parameters["minheatlength"],
+            "x_axis_type": args.x_axis_type,
+        },
     )
 
-    sections_df = source_df_calved.groupby(["foldername", "Cow Number"]).apply(
-        cut_time_window,
-        start_dim=start_parameters["start_dim"],
-        stop_dim=start_parameters["stop_dim"],
-        interpolation_limit=args.interpolation_limit,
+
+def run_watch(args, start_parameters, out_filename, executor):
+    """Keeps parsed files and results per lactation in memory and updates the outputs on changes.
+
+    The data folder is scanned every args.watch seconds. Only cows in new, changed or removed files
+    are cleaned and calculated again, outputs are replaced atomically. Stops with Ctrl+C.
+    """
+    source_files = bh_watch.SourceFiles(
+        start_parameters["language"], relative_path=args.relative_path, cache=args.cache, reader=args.reader
     )
-    sections_df = sections_df.reset_index().drop(columns="level_2")
+    store_path = get_store_path(args, start_parameters) if args.incremental else None
+    store = bh_store.load_store(store_path) if args.incremental else {}
+    source_df_calved = None
 
-    heats_df = sections_df.groupby(["foldername", "Cow Number", "lactation_adj"]).apply(
-        calc_heats, start_parameters["threshold"], start_parameters["minheatlength"]
+    print(f"Watching for SCR files every {args.watch:g}s, stop with Ctrl+C.")
+    try:
+        while True:
+            changed_cows = source_files.scan(executor)
+            if changed_cows:
+                print(f"\n{datetime.now():%H:%M:%S} {len(changed_cows)} cow(s) changed, processing ...")
+                # errors are reported and the folder is watched further, outputs are kept until the next update
+                try:
+                    source_df_calved = update_calved_data(
+                        source_df_calved, source_files.get_source_data(), changed_cows, executor
+                    )
+                    write_watch_outputs(args, start_parameters, out_filename, store, source_df_calved, executor)
+                    if args.incremental:
+                        bh_store.save_store(store_path, store)
+                except Exception as exception:  # pylint: disable=broad-except
+                    source_df_calved = None
+                    print("Error:", exception)
+
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        print("\nWatch stopped.")
+
+
+def update_calved_data(source_df_calved, source_df, changed_cows, executor):
+    """Cleans the rows of changed cows in source_df again, other cows are kept from source_df_calved"""
+    if source_df_calved is None:
+        return get_calved_data(source_df, executor)
+
+    changed_mask = pd.MultiIndex.from_frame(source_df[COW_KEYS]).isin(list(changed_cows))
+    changed_df = get_calved_data(source_df[changed_mask], executor) if changed_mask.any() else None
+    return bh_watch.update_source_frame(source_df_calved, changed_df, changed_cows)
+
+
+def write_watch_outputs(args, start_parameters, out_filename, store, source_df_calved, executor):
+    """Calculates changed lactations and replaces the output files, see run_watch"""
+    sections_df, heats_filtered_df = calc_results_incremental(
+        source_df_calved, start_parameters, args.interpolation_limit, store, executor
     )
 
-    heats_df = heats_df.reset_index().drop(columns="level_3")
-    heats_filtered_df = heats_df[heats_df["act_usable"] > 0]
+    # outputs are written to temporary files first and moved into place when complete
+    tmp_filename = bh_watch.get_tmp_filename(out_filename)
+    written_files = []
+
+    if not args.no_xlsx:
+        bh_output.write_xlsx(heats_filtered_df, filename=tmp_filename)
+        os.replace(tmp_filename + ".xlsx", out_filename + ".xlsx")
+        written_files.append(out_filename + ".xlsx")
+
+    if args.export_results:
+        tmp_results = bh_watch.get_tmp_filename(args.export_results)
+        bh_output.write_results(heats_filtered_df, tmp_results)
+        os.replace(tmp_results, args.export_results)
+        written_files.append(args.export_results)
+
+    if not (args.no_pdf or is_sweep(start_parameters)):
+        if bh_output.can_merge_pdf():
+            write_pdf_incremental(
+                store,
+                heats_filtered_df,
+                sections_df,
+                threshold=start_parameters["threshold"][0],
+                filename=tmp_filename,
+                x_axis_type=args.x_axis_type,
+            )
+        else:
+            bh_output.write_pdf(
+                heats_filtered_df,
+                sections_df=sections_df,
+                threshold=start_parameters["threshold"][0],
+                filename=tmp_filename,
+                x_axis_type=args.x_axis_type,
+                executor=executor,
+            )
+        os.replace(tmp_filename + ".pdf", out_filename + ".pdf")
+        written_files.append(out_filename + ".pdf")
+
+    print(f"\n{datetime.now():%H:%M:%S} updated {', '.join(written_files)}")
+
+
+# %%
+def main():
+    print_welcome()
+    args = bh_input.get_args()
+    bh_progress.set_mode(args.progress)
+    start_parameters = bh_input.get_start_parameters(args)
 
     if args.outputname:
         out_filename = args.outputname
     else:
         out_filename = (
             f"BovHEAT_start{start_parameters['start_dim']}"
-            + f"_stop{start_parameters['stop_dim']}_t{start_parameters['threshold']}"
-            + f"_obs{start_parameters['minheatlength']}_"
+            + f"_stop{start_parameters['stop_dim']}_t{format_values(start_parameters['threshold'])}"
+            + f"_obs{format_values(start_parameters['minheatlength'])}_"
             + datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         )
 
-    print("\nCalculation finished - Writing xlsx file...")
-    bh_output.write_xlsx(heats_filtered_df, filename=out_filename)
-
-    print("\nWriting PDF file... you can cancel this step at any time.")
-    bh_output.write_pdf(
-        heats_filtered_df,
-        sections_df=sections_df,
-        threshold=start_parameters["threshold"],
-        filename=out_filename,
-        x_axis_type=args.x_axis_type
-    )
+    with bh_profile.profile_session(args.profile):
+        # one executor for all parallel stages, worker processes are started only once
+        with bh_input.get_executor(args.cores, args.executor) as executor:
+            if args.watch is not None:
+                run_watch(args, start_parameters, out_filename, executor)
+                return
+            if args.streaming:
+                run_streaming(args, start_parameters, out_filename, executor)
+            else:
+                run_analysis(args, start_parameters, out_filename, executor)
 
     input("Hit Enter to close.")
 
@@ -6,8 +6,8 @@ from bovheat_src import bovheat
 
 
 def test_complete_runthrough(monkeypatch):
-    # add custom argv
-    additional_argv = "example/data -s -5 30 -l eng -t 35 -o out_file -i 2".split(" ")
+    # add custom argv, the source file cache is not written into the repository
+    additional_argv = "example/data -s -5 30 -l eng -t 35 -o out_file -i 2 --cache off".split(" ")
     monkeypatch.setattr(sys, "argv", [sys.argv[0]] + additional_argv)
     monkeypatch.setattr("sys.stdin", io.StringIO("enter"))
 
@@ -17,11 +17,13 @@ def test_complete_runthrough(monkeypatch):
 
     print(os.getcwd())
 
-    # read generated and validated dataset
-    validated_results_df = pd.read_excel(
-        "tests/integration/test_validate_results/validated_results.xlsx"
+    # read generated and validated dataset, long and wide sheet
+    validated_results = pd.read_excel(
+        "tests/integration/test_validate_results/validated_results.xlsx", sheet_name=None
     )
-    out_file_df = pd.read_excel("out_file.xlsx")
+    out_file = pd.read_excel("out_file.xlsx", sheet_name=None)
 
     # compare
-    assert validated_results_df.equals(out_file_df)
+    assert list(out_file) == list(validated_results) == ["long", "wide"]
+    for sheet_name, validated_results_df in validated_results.items():
+        assert validated_results_df.equals(out_file[sheet_name]), sheet_name
@@ -0,0 +1,27 @@
+# pylint: disable-all
+import pytest
+
+from bovheat_src import bh_input, bovheat as bh
+
+SOURCE_PATH = "tests/unit/test_read_sourcedata_and_clean/Test1_eng_xlsx/"
+
+
+@pytest.fixture(scope="session")
+def start_parameters():
+    return {"start_dim": -5, "stop_dim": 30, "threshold": [35], "minheatlength": [1]}
+
+
+@pytest.fixture(scope="session")
+def source_df():
+    return bh_input.get_source_data("eng", 1, relative_path=SOURCE_PATH)
+
+
+@pytest.fixture(scope="session")
+def calved_df(source_df):
+    return bh.get_calved_data(source_df)
+
+
+@pytest.fixture(scope="session")
+def results(calved_df, start_parameters):
+    """sections_df and heats_df of Test1_eng_xlsx with start_parameters"""
+    return bh.calc_results(calved_df, start_parameters, 2)
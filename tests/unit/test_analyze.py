@@ -0,0 +1,85 @@
+# pylint: disable-all
+import io
+import sys
+
+import pandas as pd
+import pytest
+
+from bovheat_src import bh_executor, bh_input, bh_output, bovheat as bh
+
+
+def test_analyze(source_df, results, capsys):
+    capsys.readouterr()
+    sections_df, heats_df = bh.analyze(source_df, -5, 30, threshold=35, minheatlength=1, interpolation_limit=2)
+
+    assert capsys.readouterr().out == ""
+    pd.testing.assert_frame_equal(sections_df, results[0])
+    pd.testing.assert_frame_equal(heats_df, results[1])
+
+
+def test_analyze_interpolation_limit(source_df):
+    # every second observation is missing, gaps of one value are filled unless interpolation is disabled
+    gaps_df = source_df.iloc[::2]
+    sections_df, _ = bh.analyze(gaps_df, -5, 30, interpolation_limit=0)
+    filled_df, _ = bh.analyze(gaps_df, -5, 30, interpolation_limit=2)
+
+    observed = sections_df.merge(gaps_df[["Cow Number", "datetime"]], on=["Cow Number", "datetime"])
+    assert sections_df["Activity Change"].count() == observed["Activity Change"].count()
+    assert filled_df["Activity Change"].count() > observed["Activity Change"].count()
+
+
+def test_cli_interpolation_limit(source_df, tmp_path, monkeypatch):
+    # -i 0 disables interpolation like analyze(interpolation_limit=0)
+    gaps_df = source_df.iloc[::2]
+    _, heats_df = bh.analyze(gaps_df, -5, 30, interpolation_limit=0)
+    bh_output.write_results(heats_df, str(tmp_path / "expected.csv"))
+
+    bh_output.write_intermediate(bh.get_calved_data(gaps_df), str(tmp_path / "gaps.pkl"))
+    argv = "-f gaps.pkl -s -5 30 -l eng -t 35 -m 1 -i 0 -c 1 --no-xlsx --no-pdf --export_results results.csv"
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["bovheat"] + argv.split())
+    monkeypatch.setattr(sys, "stdin", io.StringIO("enter"))
+    bh.main()
+
+    pd.testing.assert_frame_equal(pd.read_csv("results.csv"), pd.read_csv("expected.csv"))
+
+
+def test_analyze_duplicated_cow(source_df, capsys):
+    # a second cow with the same number but different data is skipped without output
+    first_cow_df = source_df[source_df["Cow Number"] == source_df["Cow Number"].iloc[0]]
+    duplicated_df = pd.concat(
+        [source_df, first_cow_df.assign(**{"Activity Change": first_cow_df["Activity Change"] + 1})]
+    )
+    capsys.readouterr()
+
+    _, heats_df = bh.analyze(duplicated_df, -5, 30)
+
+    assert capsys.readouterr().out == ""
+    assert source_df["Cow Number"].iloc[0] not in heats_df["Cow Number"].values
+
+    bh.get_calved_data(duplicated_df)
+    assert "Cow Number is not unique within folder" in capsys.readouterr().out
+
+
+def test_analyze_arrays(source_df, results):
+    source = {column: source_df[column].to_numpy(dtype=object) for column in bh_input.SOURCE_COLUMNS}
+    source["foldername"] = source_df["foldername"].iloc[0]
+
+    _, heats_df = bh.analyze(source, -5, 30)
+
+    pd.testing.assert_frame_equal(heats_df, results[1])
+
+
+def test_analyze_calved_sweep(calved_df, start_parameters):
+    parameters = dict(start_parameters, threshold=[25, 35], minheatlength=[1, 2])
+    _, expected_df = bh.calc_results(calved_df, parameters, 2)
+
+    with bh_executor.Executor("thread", 2) as executor:
+        _, heats_df = bh.analyze(calved_df, -5, 30, [25, 35], [1, 2], executor=executor)
+
+    pd.testing.assert_frame_equal(heats_df, expected_df)
+
+
+def test_analyze_missing_columns(source_df):
+    with pytest.raises(ValueError, match="Activity Change"):
+        bh.analyze(source_df.drop(columns="Activity Change"), -5, 30)
@@ -0,0 +1,29 @@
+# pylint: disable-all
+import pandas as pd
+import pytest
+
+from bovheat_src import bh_benchmark, bh_input, bovheat as bh
+
+
+@pytest.mark.parametrize("schema", bh_benchmark.SCHEMAS)
+def test_synthetic_workbooks(tmp_path, schema):
+    args = bh_benchmark.get_args(["--schema", schema, "--cows", "3", "--days", "42"])
+    source_files = bh_benchmark.make_source_files(bh_benchmark.get_config(args))
+    bh_benchmark.write_workbooks(source_files, str(tmp_path))
+
+    # in-memory frames equal the data read from the synthetic workbooks
+    workbook_df = bh.get_calved_data(bh_input.get_source_data("eng", 1, relative_path=str(tmp_path)))
+    frame_df = bh.get_calved_data(bh_benchmark.get_source_frame(source_files))
+    pd.testing.assert_frame_equal(workbook_df, frame_df)
+
+    assert workbook_df["Cow Number"].nunique() == 3
+    assert workbook_df["calving_date"].notna().any()
+
+
+def test_run_benchmark():
+    args = bh_benchmark.get_args(["--cows", "4", "--days", "56", "--source", "frames", "--skip_pdf"])
+    result = bh_benchmark.run_benchmark(bh_benchmark.get_config(args))
+
+    assert list(result["stages"]) == ["read", "clean", "calving", "window", "heats", "xlsx"]
+    assert result["rows"]["lactations"] == 4
+    assert "ratio" in bh_benchmark.format_results(result, baseline=result)
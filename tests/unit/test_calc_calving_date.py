@@ -37,10 +37,70 @@ from bovheat_src import bovheat as bh
         ),
         # 3 Test Missing Days in Lactation
         (
-            pd.DataFrame({"foldername": ["1"], "Cow Number": ["1"], "Days in Lactation": [None]}),
+            pd.DataFrame(
+                {
+                    "foldername": ["1"],
+                    "Cow Number": ["1"],
+                    "Days in Lactation": [None],
+                    "datetime": [pd.to_datetime("2015-02-20 10:00:00")],
+                }
+            ),
             None,
         ),
     ],
 )
 def test_calc_calving_date(data, output):
-    assert bh.calc_calving_date(data) == output
+    calved_df = bh.add_calving_dates(data.assign(**{"Lactation Number": 1}))
+    assert calved_df["calving_date"].drop_duplicates().tolist() == [pd.NaT if output is None else output]
+
+
+def test_add_calving_dates():
+    data = pd.DataFrame(
+        {
+            "foldername": ["1"] * 7,
+            "Cow Number": [1, 1, 1, 1, 2, 2, 3],
+            "Lactation Number": [1, 1, 2, 2, 1, 1, 1],
+            "Days in Lactation": [100, 20, 3, 4, 2, 3, -1],
+            "datetime": pd.to_datetime(
+                [
+                    "2015-02-20 10:00:00",
+                    "2015-02-23 10:00:00",
+                    "2015-05-10 08:00:00",
+                    # implies 2015-05-08, one day later than the row above
+                    "2015-05-12 08:00:00",
+                    "2015-03-02 00:00:00",
+                    "2015-03-03 22:00:00",
+                    "2015-03-03 22:00:00",
+                ]
+            ),
+        }
+    )
+
+    calved_df = bh.add_calving_dates(data)
+
+    assert calved_df.drop_duplicates(["Cow Number", "Lactation Number"])["calving_date"].tolist() == [
+        pd.to_datetime("2015-02-03 00:00:00"),
+        pd.to_datetime("2015-05-07 00:00:00"),
+        pd.to_datetime("2015-02-28 00:00:00"),
+        # negative DIM, no calving date
+        pd.NaT,
+    ]
+    assert calved_df["calving_date_inconsistent"].tolist() == [True, True, True, True, False, False, False]
+
+
+def test_add_calving_dates_missing_dim(recwarn):
+    data = pd.DataFrame(
+        {
+            "foldername": ["1"] * 3,
+            "Cow Number": [1, 1, 2],
+            "Lactation Number": [1, 1, 1],
+            "Days in Lactation": [None, 2, None],
+            "datetime": pd.to_datetime(["2015-02-20 08:00:00", "2015-02-20 10:00:00", "2015-03-01 00:00:00"]),
+        }
+    )
+
+    calved_df = bh.add_calving_dates(data)
+
+    assert not [warning for warning in recwarn if issubclass(warning.category, RuntimeWarning)]
+    assert calved_df["calving_date"].tolist()[:2] == [pd.to_datetime("2015-02-18 00:00:00")] * 2
+    assert pd.isna(calved_df["calving_date"].iloc[2])
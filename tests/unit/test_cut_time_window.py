@@ -0,0 +1,59 @@
+# pylint: disable-all
+import numpy as np
+import pandas as pd
+import pytest
+
+from bovheat_src import bovheat as bh
+
+
+@pytest.mark.parametrize("interpolation_limit", [None, 1, 2, 5])
+def test_interpolate_windows(interpolation_limit):
+    window_length = 12
+    values = np.random.default_rng(0).integers(-50, 100, 10 * window_length).astype(float)
+    values[np.random.default_rng(1).random(len(values)) < 0.4] = np.nan
+
+    expected = np.concatenate(
+        [
+            pd.Series(window).interpolate(limit_area="inside", limit=interpolation_limit).to_numpy()
+            for window in values.reshape(-1, window_length)
+        ]
+    )
+
+    np.testing.assert_array_equal(
+        bh.interpolate_windows(values, window_length, interpolation_limit), expected
+    )
+
+
+def test_interpolate_windows_disabled():
+    values = np.array([1.0, np.nan, 3.0, np.nan, np.nan, 6.0])
+
+    np.testing.assert_array_equal(bh.interpolate_windows(values, 6, 0), values)
+
+
+def test_cut_time_window():
+    calving_date = pd.to_datetime("2015-02-20 00:00:00")
+    source_df_calved = pd.DataFrame(
+        {
+            "foldername": ["testfarm"] * 3,
+            "Cow Number": [12345] * 3,
+            "datetime": pd.to_datetime(
+                ["2015-02-19 22:00:00", "2015-02-20 02:00:00", "2015-02-20 08:00:00"]
+            ),
+            "Activity Change": [10.0, 20.0, 50.0],
+            "Lactation Number": [1, 2, 2],
+            "Days in Lactation": [300, 0, 0],
+            "calving_date": [pd.NaT, calving_date, calving_date],
+        }
+    )
+
+    sections_df = bh.cut_time_window(source_df_calved, start_dim=-1, stop_dim=1, interpolation_limit=1)
+
+    assert len(sections_df) == 24
+    assert sections_df["datetime"].iloc[0] == calving_date - pd.Timedelta(days=1)
+    assert (sections_df["lactation_adj"] == 2).all()
+    # 22:00 of the previous lactation is part of the window, 00:00 and 04:00 are interpolated, 06:00 is not
+    activity = sections_df.set_index("datetime")["Activity Change"]
+    assert activity["2015-02-19 22:00:00"] == 10
+    assert activity["2015-02-20 00:00:00"] == 15
+    assert activity["2015-02-20 04:00:00"] == 30
+    assert np.isnan(activity["2015-02-20 06:00:00"])
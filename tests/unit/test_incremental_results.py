@@ -0,0 +1,95 @@
+# pylint: disable-all
+import argparse
+
+import pandas as pd
+import pytest
+
+from bovheat_src import bh_executor, bh_output, bovheat as bh
+
+
+def test_calc_results_incremental(calved_df, start_parameters):
+    store = {}
+    _, heats_df = bh.calc_results_incremental(calved_df, start_parameters, 2, store)
+    _, expected_df = bh.calc_results(calved_df, start_parameters, 2)
+    pd.testing.assert_frame_equal(heats_df, expected_df.reset_index(drop=True), check_dtype=False)
+
+    # unchanged lactations are taken from the store
+    fingerprints = {key: entry["fingerprint"] for key, entry in store.items()}
+    _, heats_df = bh.calc_results_incremental(calved_df, start_parameters, 2, store)
+    pd.testing.assert_frame_equal(heats_df, expected_df.reset_index(drop=True), check_dtype=False)
+
+    # changed cow is recalculated
+    changed_cow = calved_df["Cow Number"].iloc[0]
+    changed_df = calved_df.copy()
+    cow_mask = changed_df["Cow Number"] == changed_cow
+    changed_df.loc[cow_mask, "Activity Change"] = changed_df.loc[cow_mask, "Activity Change"] + 30
+
+    _, heats_df = bh.calc_results_incremental(changed_df, start_parameters, 2, store)
+    _, expected_df = bh.calc_results(changed_df, start_parameters, 2)
+    pd.testing.assert_frame_equal(heats_df, expected_df.reset_index(drop=True), check_dtype=False)
+
+    changed_keys = [key for key, entry in store.items() if entry["fingerprint"] != fingerprints[key]]
+    assert changed_keys and all(key[1] == changed_cow for key in changed_keys)
+
+
+@pytest.fixture
+def drawn_lactations(monkeypatch):
+    """Lactations drawn by render_pdf_pages, one list per call"""
+    drawn = []
+    render_pdf_pages = bh_output.render_pdf_pages
+
+    def record_pdf_pages(*args, **kwargs):
+        pages = render_pdf_pages(*args, **kwargs)
+        drawn.append(sorted(pages))
+        return pages
+
+    monkeypatch.setattr(bh_output, "render_pdf_pages", record_pdf_pages)
+    return drawn
+
+
+def test_write_pdf_incremental(calved_df, start_parameters, drawn_lactations, tmp_path, monkeypatch):
+    pypdf = pytest.importorskip("pypdf")
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+    cows = calved_df["Cow Number"].drop_duplicates().iloc[:3].tolist()
+    cows_df = calved_df[calved_df["Cow Number"].isin(cows)]
+    intermediate = str(tmp_path / "calved.pkl")
+    args = argparse.Namespace(
+        relative_path=str(tmp_path),
+        intermediate=intermediate,
+        export_intermediate=None,
+        incremental=True,
+        interpolation_limit=2,
+        no_xlsx=True,
+        no_pdf=False,
+        export_results=None,
+        x_axis_type="dim",
+    )
+    executor = bh_executor.Executor("serial", 1)
+
+    def run(source_df, parameters=start_parameters):
+        bh_output.write_intermediate(source_df, intermediate)
+        drawn_lactations.clear()
+        bh.run_analysis(args, parameters, str(tmp_path / "out"), executor)
+        pdf_file = pypdf.PdfReader(tmp_path / "out.pdf")
+        return [lactation for lactations in drawn_lactations for lactation in lactations], [
+            page.get_contents().get_data() for page in pdf_file.pages
+        ]
+
+    drawn, pages = run(cows_df)
+    assert len(drawn) == len(pages) > 1
+
+    # unchanged input, all pages are taken from the store
+    assert run(cows_df) == ([], pages)
+
+    # changed cow, only its pages are drawn again
+    changed_cow = drawn[-1][1]
+    changed_df = cows_df.copy()
+    changed_mask = changed_df["Cow Number"] == changed_cow
+    changed_df.loc[changed_mask, "Activity Change"] = changed_df.loc[changed_mask, "Activity Change"] + 30
+    changed_drawn, changed_pages = run(changed_df)
+    assert changed_drawn == [lactation for lactation in drawn if lactation[1] == changed_cow]
+    assert len(changed_pages) == len(pages) and changed_pages != pages
+
+    # stores of other parameters are not reused
+    for parameters in [dict(start_parameters, threshold=[30]), dict(start_parameters, start_dim=-3, stop_dim=20)]:
+        assert len(run(changed_df, parameters)[0]) == len(pages)
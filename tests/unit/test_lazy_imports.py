@@ -0,0 +1,13 @@
+# pylint: disable-all
+import subprocess
+import sys
+
+
+def test_heavy_modules_not_imported_at_startup():
+    code = (
+        "import sys; from bovheat_src import bovheat; "
+        "print(','.join(m for m in ('matplotlib', 'openpyxl', 'xlsxwriter') if m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == ""
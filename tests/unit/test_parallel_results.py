@@ -0,0 +1,63 @@
+# pylint: disable-all
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bovheat_src import bh_executor, bovheat as bh
+
+
+def test_share_frame():
+    df = pd.DataFrame(
+        {
+            "foldername": pd.Categorical(["b", "a", "b", "c"]),
+            "Cow Number": pd.array([2, 1, None, 3], dtype="Int32"),
+            "Activity Change": np.arange(4, dtype="float32"),
+            "note": ["w", "x", "y", "z"],
+            "datetime": pd.date_range("2019-02-04", periods=4, freq="2h"),
+        }
+    )
+    row_order = np.array([3, 1, 0, 2])
+
+    blocks, frame_spec = bh_executor.share_frame(df, row_order)
+    assert list(frame_spec["pickled"].columns) == ["note"]
+    try:
+        shard_df = bh_executor.attach_frame(bh_executor.get_shard_spec(frame_spec, 1, 3))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    pd.testing.assert_frame_equal(shard_df, df.iloc[[1, 0]].reset_index(drop=True))
+
+
+def test_map_shards_no_resource_warnings():
+    # blocks attached in worker processes must not be reported as leaked by the resource tracker
+    code = (
+        "import pandas as pd; from bovheat_src import bh_executor\n"
+        "df = pd.DataFrame({'cow': range(40), 'datetime': pd.date_range('2019-02-04', periods=40)})\n"
+        "with bh_executor.Executor('process', 2) as executor:\n"
+        "    executor.starmap(abs, [(-1,)])  # workers started before the first block is shared\n"
+        "    assert sum(bh_executor.map_shards(executor, len, df, ['cow'])) == 40\n"
+    )
+    stderr = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stderr
+
+    assert stderr == ""
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+@pytest.mark.parametrize("threshold, minheatlength", [([35], [1]), ([30, 35], [1, 2])])
+def test_calc_results_sharded(source_df, calved_df, start_parameters, kind, threshold, minheatlength):
+    start_parameters = dict(start_parameters, threshold=threshold, minheatlength=minheatlength)
+    expected_sections_df, expected_heats_df = bh.calc_results(calved_df, start_parameters, 2)
+
+    # cows are split into several shards, results are merged in the original order
+    with bh_executor.Executor(kind, 2) as executor:
+        pd.testing.assert_frame_equal(bh.get_calved_data(source_df, executor), calved_df)
+
+        sections_df, heats_df = bh.calc_results(calved_df, start_parameters, 2, executor)
+
+    pd.testing.assert_frame_equal(sections_df, expected_sections_df)
+    pd.testing.assert_frame_equal(heats_df, expected_heats_df)
@@ -88,3 +88,92 @@ def test_peakcalculation(minheatlength, input_df, heat_df):
         heat_df,
         check_dtype=False,
     )
+
+
+def test_peakcalculation_all_lactations():
+    # heat at the end of lactation 1 must not continue into lactation 2
+    second_df = input_df.assign(**{"Activity Change": input_df["Activity Change"][::-1].values})
+    sections_df = pd.concat(
+        [input_df.assign(lactation_adj=1), second_df.assign(lactation_adj=2)], ignore_index=True
+    )
+
+    heats_df = bh.calc_all_heats(sections_df, threshold=35, minheatlength=1)
+
+    expected_df = pd.DataFrame(
+        data=[
+            dict(
+                lactation_adj=1,
+                heat_count=2,
+                heat_no=1,
+                start_dt_heat=pd.to_datetime("2015-02-24 08:00:00"),
+                stop_dt_heat=pd.to_datetime("2015-02-24 08:00:00"),
+                duration_heat=2,
+                max_act_heat=35,
+                max_dim_heat=8,
+                max_dt_heat=pd.to_datetime("2015-02-24 08:00:00"),
+                short_inter_estrus=None,
+            ),
+            dict(
+                lactation_adj=1,
+                heat_count=2,
+                heat_no=2,
+                start_dt_heat=pd.to_datetime("2015-02-24 16:00:00"),
+                stop_dt_heat=pd.to_datetime("2015-02-24 22:00:00"),
+                duration_heat=8,
+                max_act_heat=66,
+                max_dim_heat=18,
+                max_dt_heat=pd.to_datetime("2015-02-24 18:00:00"),
+                short_inter_estrus=1,
+            ),
+            dict(
+                lactation_adj=2,
+                heat_count=2,
+                heat_no=1,
+                start_dt_heat=pd.to_datetime("2015-02-24 06:00:00"),
+                stop_dt_heat=pd.to_datetime("2015-02-24 12:00:00"),
+                duration_heat=8,
+                max_act_heat=66,
+                max_dim_heat=10,
+                max_dt_heat=pd.to_datetime("2015-02-24 10:00:00"),
+                short_inter_estrus=None,
+            ),
+            dict(
+                lactation_adj=2,
+                heat_count=2,
+                heat_no=2,
+                start_dt_heat=pd.to_datetime("2015-02-24 20:00:00"),
+                stop_dt_heat=pd.to_datetime("2015-02-24 20:00:00"),
+                duration_heat=2,
+                max_act_heat=35,
+                max_dim_heat=20,
+                max_dt_heat=pd.to_datetime("2015-02-24 20:00:00"),
+                short_inter_estrus=1,
+            ),
+        ]
+    )
+    pd.testing.assert_frame_equal(heats_df[expected_df.columns], expected_df, check_dtype=False)
+
+
+def test_heat_sweep():
+    sections_df = input_df.assign(lactation_adj=1)
+
+    sweep_df = bh.calc_heat_sweep(sections_df, thresholds=[20, 35], minheatlengths=[1, 2])
+
+    for (threshold, minheatlength), heats_df in sweep_df.groupby(["threshold", "minheatlength"]):
+        pd.testing.assert_frame_equal(
+            heats_df.drop(columns=["threshold", "minheatlength"]).reset_index(drop=True),
+            bh.calc_all_heats(sections_df, threshold, minheatlength),
+        )
+
+
+def test_heat_no_integer_labels():
+    # lactations without heats keep one row without heat_no
+    sections_df = pd.concat(
+        [input_df.assign(lactation_adj=1), input_df.assign(lactation_adj=2, **{"Activity Change": 0})],
+        ignore_index=True,
+    )
+
+    heats_df = bh.calc_all_heats(sections_df, threshold=35, minheatlength=1)
+
+    assert heats_df["heat_no"].dtype == "Int64"
+    assert heats_df["heat_no"].tolist() == [1, 2, pd.NA]
@@ -0,0 +1,65 @@
+# pylint: disable-all
+import json
+
+import pytest
+
+from bovheat_src import bh_executor, bh_input, bh_profile, bovheat as bh
+
+
+@pytest.fixture
+def profiling(monkeypatch):
+    monkeypatch.setattr(bh_profile, "_enabled", True)
+    monkeypatch.setattr(bh_profile, "_records", [])
+
+
+def test_profiled_disabled(monkeypatch):
+    monkeypatch.setattr(bh_profile, "_records", [])
+
+    @bh_profile.profiled("stage")
+    def func(value):
+        return value + 1
+
+    assert func(1) == 2
+    assert bh_profile.take_records() == []
+
+
+@pytest.mark.parametrize("kind", ["serial", "process"])
+def test_profile_stages(profiling, start_parameters, kind):
+    with bh_executor.Executor(kind, 2) as executor:
+        source_df = bh_input.get_source_data(
+            "eng", relative_path="tests/unit/test_read_sourcedata_and_clean/Test1_eng_xlsx/", executor=executor
+        )
+        calved_df = bh.get_calved_data(source_df, executor)
+        bh.calc_results(calved_df, start_parameters, 2, executor)
+
+    summary = {stage["stage"]: stage for stage in bh_profile.get_summary(bh_profile.take_records())}
+
+    assert list(summary) == [
+        "read_clean_file",
+        "get_source_data",
+        "get_cleaned_data",
+        "calc_calving_date",
+        "cut_time_window",
+        "calc_heats",
+    ]
+    assert summary["read_clean_file"]["calls"] == 1
+    assert summary["get_source_data"]["rows"] == len(source_df)
+    assert summary["get_cleaned_data"]["groups"] == calved_df.groupby(bh.COW_KEYS).ngroups
+    for stage in summary.values():
+        assert stage["wall"] >= 0 and stage["cpu"] >= 0
+
+
+def test_profile_session(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(bh_profile, "_enabled", False)
+    filename = str(tmp_path / "profile.json")
+
+    with bh_profile.profile_session(filename):
+        bh.get_cleaned_data(
+            bh_input.get_source_data("eng", 1, relative_path="tests/unit/test_read_sourcedata_and_clean/Test1_eng_xlsx/")
+        )
+
+    assert "get_cleaned_data" in capsys.readouterr().out
+    with open(filename) as json_file:
+        profile = json.load(json_file)
+    assert [stage["stage"] for stage in profile["summary"]] == ["read_clean_file", "get_source_data", "get_cleaned_data"]
+    assert len(profile["records"]) == 3
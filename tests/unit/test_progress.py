@@ -0,0 +1,64 @@
+# pylint: disable-all
+import json
+
+import pytest
+
+from bovheat_src import bh_progress
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(bh_progress.time, "perf_counter", lambda: now[0])
+    return now
+
+
+def test_progress_json(monkeypatch, capsys, clock):
+    monkeypatch.setattr(bh_progress, "_mode", "json")
+
+    with bh_progress.Progress("Reading files", total=10, unit="files") as progress:
+        for _ in range(10):
+            clock[0] += 0.1
+            progress.update()
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    # reports at most every REFRESH_SECONDS and once on exit
+    assert [line["done"] for line in lines] == [3, 6, 9, 10]
+    assert lines[0] == {
+        "stage": "Reading files",
+        "done": 3,
+        "total": 10,
+        "unit": "files",
+        "elapsed": 0.3,
+        "rate": 10.0,
+        "eta": 0.7,
+        "finished": False,
+    }
+    assert lines[-1]["finished"]
+
+
+def test_progress_bar(monkeypatch, capsys, clock):
+    monkeypatch.setattr(bh_progress, "_mode", "bar")
+
+    with bh_progress.Progress("Writing PDF", total=4, unit="pages") as progress:
+        clock[0] += 1
+        progress.update(2)
+
+    out = capsys.readouterr().out
+    assert out.startswith("\r Writing PDF [##########----------] 2/4 pages, 2/s, ETA 0:01")
+    assert "\r Writing PDF [##########----------] 2/4 pages, 2/s, 1.0s" in out
+
+
+def test_progress_none(monkeypatch, capsys):
+    monkeypatch.setattr(bh_progress, "_mode", "none")
+
+    with bh_progress.Progress("Cleaning data") as progress:
+        progress.update(100)
+
+    assert capsys.readouterr().out == ""
+
+
+def test_set_mode():
+    with pytest.raises(ValueError):
+        bh_progress.set_mode("verbose")
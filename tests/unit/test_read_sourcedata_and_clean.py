@@ -1,6 +1,37 @@
 # pylint: disable-all
+import datetime
+import shutil
+
+import pandas as pd
 import pytest
-from bovheat_src import bh_input, bovheat
+from bovheat_src import bh_executor, bh_input, bh_output, bovheat
+
+
+def get_cleaned_copy(cowdf):
+    """Reference implementation of get_cleaned_data for the data of a single cow"""
+    cowdf = cowdf.copy()
+
+    cowdf.dropna(subset=["Lactation Number"], inplace=True)
+
+    # makes sure df is sorted
+    cowdf.sort_values(by="datetime", inplace=True)
+    cowdf.reset_index(drop=True, inplace=True)
+
+    # Weekly schema creates overlapping empty 12:00am rows. Removing.
+    duplicate_mask = cowdf.duplicated("datetime", keep=False)
+    overlap_rows = cowdf[duplicate_mask & cowdf["Activity Change"].isna()]
+    cowdf.drop(overlap_rows.index, inplace=True)
+
+    # Drop complete duplicates. Same cow information found in multiple files.
+    cowdf.drop_duplicates(inplace=True, ignore_index=True)
+    cowdf.reset_index(inplace=True, drop=True)
+
+    # If duplicates continue to remain, cow number is not unique in folder. Skipping cow.
+    if cowdf.duplicated(["datetime", "Cow Number"]).sum():
+        return pd.DataFrame()
+
+    return cowdf
+
 
 # runs tests with multiprocessing. 0: auto (max available -1), 1: disabled, 2: fixed 2 cores
 @pytest.fixture(params=[0, 1, 2])
@@ -13,9 +44,9 @@ def cpu_count(request):
     "lang, rel_path, out1, out2",
     [
         # Test 1 - eng and xlsx
-        ("eng", "tests/unit/test_read_sourcedata_and_clean/Test1_eng_xlsx/", 6994, 6204),
+        ("eng", "tests/unit/test_read_sourcedata_and_clean/Test1_eng_xlsx/", 6994, 6994),
         # Test 2 - ger and xls
-        ("ger", "tests/unit/test_read_sourcedata_and_clean/Test2_ger_xls/", 6970, 6366),
+        ("ger", "tests/unit/test_read_sourcedata_and_clean/Test2_ger_xls/", 6970, 6960),
     ],
 )
 def test_calc_calving_date_pass(lang, cpu_count, rel_path, out1, out2):
@@ -24,7 +55,28 @@ def test_calc_calving_date_pass(lang, cpu_count, rel_path, out1, out2):
     assert len(df) == out1
 
     # Test cleaning loaded data
-    assert len(bovheat.get_cleaned_copy(df)) == out2
+    assert len(bovheat.get_cleaned_data(df)) == out2
+
+
+@pytest.mark.parametrize(
+    "lang, rel_path",
+    [
+        ("eng", "tests/unit/test_read_sourcedata_and_clean/Test1_eng_xlsx/"),
+        ("ger", "tests/unit/test_read_sourcedata_and_clean/Test2_ger_xls/"),
+    ],
+)
+def test_get_cleaned_data(lang, rel_path):
+    df = bh_input.get_source_data(lang, 1, relative_path=rel_path)
+
+    # add a second cow with the same number but different data, cow has to be skipped
+    first_cow_df = df[df["Cow Number"] == df["Cow Number"].iloc[0]]
+    df = pd.concat([df, first_cow_df.assign(**{"Activity Change": first_cow_df["Activity Change"] + 1})])
+
+    expected_df = df.groupby(["foldername", "Cow Number"], group_keys=False).apply(get_cleaned_copy)
+    cleaned_df = bovheat.get_cleaned_data(df)
+
+    pd.testing.assert_frame_equal(cleaned_df, expected_df.reset_index(drop=True))
+    assert df["Cow Number"].iloc[0] not in cleaned_df["Cow Number"].values
 
 
 # Test exceptions
@@ -52,3 +104,122 @@ def test_calc_calving_date_fail(lang, cpu_count, rel_path, exception_msg):
 
     # Check exception message
     assert exception_msg in str(e.value)
+
+
+def test_get_source_data_cache(tmp_path, monkeypatch):
+    source = "tests/unit/test_read_sourcedata_and_clean/Test1_eng_xlsx/February 25 2019.xlsx"
+    shutil.copy(source, tmp_path)
+
+    parsed_df = bh_input.get_source_data("eng", 1, relative_path=str(tmp_path), cache="on")
+    assert (tmp_path / bh_input.CACHE_DIRNAME).is_dir()
+
+    # unchanged files must not be parsed again
+    monkeypatch.setattr(bh_input, "read_clean_file", None)
+    cached_df = bh_input.get_source_data("eng", 1, relative_path=str(tmp_path), cache="on")
+    pd.testing.assert_frame_equal(parsed_df, cached_df)
+
+    monkeypatch.undo()
+    cleared_df = bh_input.get_source_data("eng", 1, relative_path=str(tmp_path), cache="clear")
+    pd.testing.assert_frame_equal(parsed_df, cleared_df)
+
+    # entries of the default reader are not used by the fast reader
+    readers = []
+    read_clean_file = bh_input.read_clean_file
+    monkeypatch.setattr(
+        bh_input, "read_clean_file", lambda *args: readers.append(args[3]) or read_clean_file(*args)
+    )
+    bh_input.get_source_data("eng", 1, relative_path=str(tmp_path), cache="on", reader="fast")
+    bh_input.get_source_data("eng", 1, relative_path=str(tmp_path), cache="on", reader="fast")
+    assert readers == ["fast"]
+
+
+def test_get_source_data_cache_not_writable(tmp_path):
+    source = "tests/unit/test_read_sourcedata_and_clean/Test1_eng_xlsx/February 25 2019.xlsx"
+    shutil.copy(source, tmp_path)
+    (tmp_path / bh_input.CACHE_DIRNAME).write_text("not a folder")
+
+    with pytest.warns(UserWarning, match="not writable"):
+        cached_df = bh_input.get_source_data("eng", 1, relative_path=str(tmp_path), cache="on")
+
+    pd.testing.assert_frame_equal(cached_df, bh_input.get_source_data("eng", 1, relative_path=str(tmp_path)))
+
+
+def test_intermediate_roundtrip(tmp_path):
+    df = bh_input.get_source_data("eng", 1, relative_path="tests/unit/test_read_sourcedata_and_clean/Test1_eng_xlsx/")
+    calved_df = bovheat.get_calved_data(df)
+
+    filename = str(tmp_path / "intermediate.pkl")
+    bh_output.write_intermediate(calved_df, filename)
+
+    pd.testing.assert_frame_equal(
+        bh_input.read_intermediate(filename),
+        calved_df[bh_input.INTERMEDIATE_COLUMNS + bh_input.INTERMEDIATE_OPTIONAL_COLUMNS],
+    )
+
+
+@pytest.mark.parametrize(
+    "root, file_name, lang",
+    [
+        ("tests/unit/test_read_sourcedata_and_clean/Test1_eng_xlsx", "February 25 2019.xlsx", "eng"),
+        ("tests/unit/test_read_sourcedata_and_clean/Test2_ger_xls", "excel_ger.xls", "ger"),
+        ("tests/unit/test_read_sourcedata_and_clean/Test3_malformed_corrupted", "text_malformed.xlsx", "eng"),
+    ],
+)
+def test_read_clean_file_fast_reader(root, file_name, lang):
+    translation_table = bh_input.get_file_list(lang, relative_path=root)[0][2]
+
+    default_df = bh_input.read_clean_file(root, file_name, translation_table)
+    fast_df = bh_input.read_clean_file(root, file_name, translation_table, reader="fast")
+
+    if default_df is None:
+        assert fast_df is None
+    else:
+        pd.testing.assert_frame_equal(default_df, fast_df)
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_read_files_executor(tmp_path, kind):
+    for folder, source in [
+        ("farm_a", "example/data/schema_weekly/February 25 2019.xlsx"),
+        ("farm_b", "example/data/schema_weekly/February 4 2019.xlsx"),
+        ("farm_b", "tests/unit/test_read_sourcedata_and_clean/Test2_ger_xls/excel_ger.xls"),
+    ]:
+        (tmp_path / folder).mkdir(exist_ok=True)
+        shutil.copy(source, tmp_path / folder)
+
+    file_list = bh_input.get_file_list("eng", relative_path=str(tmp_path))
+    serial_df = bh_input.read_files(file_list, executor=bh_executor.Executor("serial"))
+
+    # results are merged in file list order, regardless of which file finished first
+    with bh_executor.Executor(kind, 2) as executor:
+        parallel_df = bh_input.read_files(file_list, executor=executor)
+        assert executor.kind == kind
+
+    pd.testing.assert_frame_equal(serial_df, parallel_df)
+    assert list(serial_df["foldername"].cat.categories) == ["farm_a", "farm_b"]
+
+
+@pytest.mark.parametrize(
+    "dates, times",
+    [
+        # 50 day schema
+        (pd.to_datetime(["2019-01-13", "2019-01-13", "2019-01-14"]), ["00:00", "14:00", "22:00"]),
+        # weekly schema
+        (pd.to_datetime(["2019-02-04", "2019-02-04", "2019-02-05"]), ["12:00 AM", "2:00 PM", "12:00 PM"]),
+        # time cells
+        (
+            pd.to_datetime(["2019-02-04", "2019-02-05", "2019-02-05"]),
+            [datetime.time(0, 0), datetime.time(14, 0), datetime.time(22, 30)],
+        ),
+        # unrecognised layouts are parsed per element
+        (["2019-02-04", "5.2.2019", "2019-02-06"], ["14:00", "2:00 PM", "12:00 AM"]),
+        (pd.to_datetime(["2019-02-04 06:00", "2019-02-05", "2019-02-05"], format="mixed"), ["14:00", "02:00", "04:00"]),
+    ],
+)
+def test_build_datetime(dates, times):
+    data = pd.DataFrame({"Date": dates, "Time": times})
+
+    pd.testing.assert_series_equal(
+        bh_input.build_datetime(data["Date"], data["Time"]),
+        pd.to_datetime(data["Date"].astype(str) + " " + data["Time"].astype(str), format="mixed"),
+    )
@@ -0,0 +1,48 @@
+# pylint: disable-all
+import argparse
+import shutil
+
+import pandas as pd
+
+from bovheat_src import bh_executor, bovheat as bh
+
+SOURCE_FILE = "tests/unit/test_read_sourcedata_and_clean/Test1_eng_xlsx/February 25 2019.xlsx"
+
+
+def test_run_streaming(tmp_path, start_parameters):
+    # two farm folders, streaming processes them one after the other
+    for folder in ["farm_a", "farm_b"]:
+        (tmp_path / folder).mkdir()
+        shutil.copy(SOURCE_FILE, tmp_path / folder)
+
+    def get_args(name):
+        return argparse.Namespace(
+            relative_path=str(tmp_path),
+            cache="off",
+            reader="default",
+            cores=1,
+            incremental=False,
+            intermediate=None,
+            export_intermediate=None,
+            interpolation_limit=2,
+            no_xlsx=False,
+            no_pdf=True,
+            export_results=str(tmp_path / f"{name}.csv"),
+            x_axis_type="dim",
+        )
+
+    parameters = dict(start_parameters, language="eng")
+    with bh_executor.Executor("serial", 1) as executor:
+        bh.run_streaming(get_args("streamed"), parameters, str(tmp_path / "streamed"), executor)
+        bh.run_analysis(get_args("expected"), parameters, str(tmp_path / "expected"), executor)
+
+    streamed = pd.read_excel(tmp_path / "streamed.xlsx", sheet_name=None)
+    expected = pd.read_excel(tmp_path / "expected.xlsx", sheet_name=None)
+    assert list(streamed) == list(expected) == ["long", "wide"]
+    for sheet_name, expected_df in expected.items():
+        pd.testing.assert_frame_equal(streamed[sheet_name], expected_df)
+    assert set(streamed["long"]["foldername"]) == {"farm_a", "farm_b"}
+
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "streamed.csv"), pd.read_csv(tmp_path / "expected.csv")
+    )
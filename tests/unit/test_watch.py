@@ -0,0 +1,82 @@
+# pylint: disable-all
+import argparse
+import os
+import shutil
+
+import pandas as pd
+
+from bovheat_src import bh_executor, bh_input, bh_output, bh_watch, bovheat as bh
+
+EXAMPLE_FOLDER = os.path.abspath("example/data/schema_weekly")
+FILE_NAMES = ["February 4 2019.xlsx", "February 11 2019.xlsx", "February 18 2019.xlsx"]
+START_PARAMETERS = {"language": "eng", "start_dim": -5, "stop_dim": 30, "threshold": [35], "minheatlength": [1]}
+
+
+def read_expected(executor):
+    """Results of a complete run on the current files"""
+    source_df = bh_input.read_files(bh_input.get_file_list("eng", "data", verbose=False), executor=executor)
+    _, heats_df = bh.analyze(source_df, -5, 30)
+    bh_output.write_results(heats_df, "expected.csv")
+    return pd.read_csv("expected.csv")
+
+
+def test_run_watch(tmp_path, monkeypatch):
+    farm_folder = tmp_path / "data" / "schema_weekly"
+    farm_folder.mkdir(parents=True)
+    for file_name in FILE_NAMES[:2]:
+        shutil.copy(os.path.join(EXAMPLE_FOLDER, file_name), farm_folder)
+    monkeypatch.chdir(tmp_path)
+
+    args = argparse.Namespace(
+        relative_path="data",
+        cache="off",
+        reader="default",
+        incremental=False,
+        watch=1.0,
+        interpolation_limit=2,
+        no_xlsx=False,
+        no_pdf=True,
+        export_results="results.csv",
+        x_axis_type="dim",
+    )
+    executor = bh_executor.Executor("serial", 1)
+    results = []
+
+    def sleep(seconds):
+        results.append(pd.read_csv("results.csv"))
+        assert not [name for name in os.listdir() if ".tmp" in name]
+        step = len(results)
+        if step == 1:
+            pd.testing.assert_frame_equal(results[-1], read_expected(executor))
+            shutil.copy(os.path.join(EXAMPLE_FOLDER, FILE_NAMES[2]), farm_folder)
+        elif step == 2:
+            # a new file is processed once it is unchanged between two scans
+            pd.testing.assert_frame_equal(results[-1], results[0])
+        elif step == 3:
+            pd.testing.assert_frame_equal(results[-1], read_expected(executor))
+            os.remove(farm_folder / FILE_NAMES[0])
+        else:
+            pd.testing.assert_frame_equal(results[-1], read_expected(executor))
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(bh.time, "sleep", sleep)
+
+    with executor:
+        bh.run_watch(args, START_PARAMETERS, "out_file", executor)
+
+    assert len(results) == 4
+    assert os.path.exists("out_file.xlsx")
+
+
+def test_source_files_scan(tmp_path):
+    farm_folder = tmp_path / "farm"
+    farm_folder.mkdir()
+    shutil.copy(os.path.join(EXAMPLE_FOLDER, FILE_NAMES[0]), farm_folder)
+
+    source_files = bh_watch.SourceFiles("eng", str(tmp_path))
+    with bh_executor.Executor("serial", 1) as executor:
+        changed_cows = source_files.scan(executor)
+        source_df = source_files.get_source_data()
+
+        assert changed_cows == set(source_df[["foldername", "Cow Number"]].itertuples(index=False, name=None))
+        assert source_files.scan(executor) == set()
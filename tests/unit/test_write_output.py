@@ -0,0 +1,128 @@
+# pylint: disable-all
+import io
+
+import pandas as pd
+import pytest
+
+from bovheat_src import bh_executor, bh_output
+
+
+@pytest.fixture(scope="module")
+def heats_df(results):
+    return results[1]
+
+
+def test_write_xlsx(heats_df, tmp_path):
+    bh_output.write_xlsx(heats_df, str(tmp_path / "streamed"))
+
+    # reads back like the sheets written by DataFrame.to_excel
+    expected_path = tmp_path / "expected.xlsx"
+    with pd.ExcelWriter(expected_path, engine="xlsxwriter") as writer:
+        heats_df.to_excel(writer, sheet_name="long", index=False)
+        bh_output.calc_long_to_wide(heats_df).to_excel(writer, sheet_name="wide", index=False)
+
+    for sheet_name in ["long", "wide"]:
+        pd.testing.assert_frame_equal(
+            pd.read_excel(tmp_path / "streamed.xlsx", sheet_name=sheet_name),
+            pd.read_excel(expected_path, sheet_name=sheet_name),
+        )
+
+
+def test_calc_long_to_wide():
+    long_df = pd.DataFrame(
+        {
+            "foldername": ["b", "a", "a", "a"],
+            "Cow Number": [2, 1, 1, 3],
+            "lactation_adj": [1.0, 2.0, 2.0, 1.0],
+            "calving_date": pd.to_datetime(["2019-02-01", "2019-01-01", "2019-01-01", "2019-03-01"]),
+            "act_usable": [100.0, 90.0, 90.0, 80.0],
+            "act_max": [70.0, 60.0, 60.0, None],
+            "heat_count": [1, 2, 2, 0],
+            "heat_no": pd.array([1, 2, 1, None], dtype="Int64"),
+            "start_dt_heat": pd.to_datetime(["2019-02-10", "2019-01-30", "2019-01-10", None]),
+            "duration_heat": [4.0, 6.0, 8.0, None],
+        }
+    )
+
+    wide_df = bh_output.calc_long_to_wide(long_df)
+
+    assert list(wide_df.columns) == bh_output.WIDE_ROW_KEYS + [
+        "duration_heat1",
+        "start_dt_heat1",
+        "duration_heat2",
+        "start_dt_heat2",
+    ]
+    assert wide_df[["foldername", "Cow Number"]].values.tolist() == [["a", 1], ["a", 3], ["b", 2]]
+    assert wide_df["duration_heat1"].tolist()[::2] == [8.0, 4.0]
+    assert wide_df["start_dt_heat2"].tolist()[0] == pd.Timestamp("2019-01-30")
+    assert wide_df.loc[1:, "start_dt_heat2"].isna().all()
+    assert wide_df["heat_count"].tolist() == [2, 0, 1]
+
+
+def test_get_col_widths():
+    df = pd.DataFrame(
+        {
+            "foldername": pd.Categorical(["a", "farm_long_name"]),
+            "Cow Number": [7, 12345678],
+            "start_dt_heat": pd.to_datetime(["2019-02-04 02:00:00", None]),
+            "heat_no": [None, None],
+        }
+    )
+
+    assert bh_output.get_col_widths(df) == [14, 10, 19, 7]
+
+
+def test_write_results_csv(heats_df, tmp_path):
+    filename = str(tmp_path / "results.csv")
+    bh_output.write_results(heats_df, filename)
+
+    results_df = pd.read_csv(filename, parse_dates=["calving_date", "start_dt_heat", "stop_dt_heat", "max_dt_heat"])
+
+    assert len(results_df) == len(heats_df)
+    assert list(results_df.columns) == list(heats_df.columns)
+    pd.testing.assert_series_equal(
+        results_df["max_dt_heat"], heats_df["max_dt_heat"].reset_index(drop=True), check_dtype=False
+    )
+
+
+@pytest.mark.parametrize("x_axis_type", ["dim", "dt"])
+def test_pdf_page_renderer(results, x_axis_type, monkeypatch):
+    # fixed PDF creation date, pages of the reused figure equal pages of a new figure
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+    sections_df, heats_df = results
+    pages = list(bh_output.get_pdf_pages(heats_df, sections_df, x_axis_type))[:3]
+    # an irregular page is drawn on a new figure
+    pages[1] = pages[1][:2] + (pages[1][2].drop(pages[1][2].index[5]),)
+    build_pdf_page = bh_output.build_pdf_page_dim if x_axis_type == "dim" else bh_output.build_pdf_page_dt
+
+    def render(draw_page):
+        page_buffer = io.BytesIO()
+        with bh_output.open_pdf(page_buffer) as pdf_file:
+            draw_page(pdf_file)
+        return page_buffer.getvalue()
+
+    with bh_output.PdfPageRenderer(35, x_axis_type) as renderer:
+        reused = [render(lambda pdf_file: renderer.draw_page(cowdf, lactation_heats_df, pdf_file))
+                  for _, lactation_heats_df, cowdf in pages]
+    new = [render(lambda pdf_file: build_pdf_page(cowdf, lactation_heats_df, pdf_file, 35))
+           for _, lactation_heats_df, cowdf in pages]
+
+    assert reused == new
+
+
+def test_write_pdf_parallel(results, tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    sections_df, heats_df = results
+    lactations_df = heats_df[bh_output.PDF_GROUP_KEYS].drop_duplicates().iloc[:7]
+    heats_df = heats_df.merge(lactations_df)
+
+    sequential = bh_output.write_pdf_pages(heats_df, sections_df, 35, str(tmp_path / "sequential.pdf"), "dim")
+    with bh_executor.Executor("process", 3) as executor:
+        bh_output.write_pdf_parallel(heats_df, sections_df, 35, str(tmp_path / "parallel.pdf"), "dim", executor)
+
+    def get_page_contents(filename):
+        return [page.get_contents().get_data() for page in pypdf.PdfReader(filename).pages]
+
+    expected = get_page_contents(sequential)
+    assert len(set(expected)) == len(lactations_df)
+    assert get_page_contents(str(tmp_path / "parallel.pdf")) == expected